@@ -0,0 +1,89 @@
+"""
+Alias Table - XMLIDs learned from confirmed matches, by channel identity
+A channel identity is the region plus the normalized channel name (see
+main.channel_identity), so "US| FOO HD" and a later "US| FOO FHD" share
+one. Playlist names confirmed in known_matches vote for their identity's
+XMLID; a new variant of the same identity then resolves without fuzzy
+or AI work.
+
+Confidence guard: an alias is only used when at least min_votes
+confirmed names agree and none disagree. Names that got their XMLID from
+another name's decision (an alias, or the representative of their
+playlist variants) never vote, so one bad match can't count twice or
+spread.
+"""
+import json
+import os
+from typing import Dict, Optional, Set
+
+# Bump when channel identities are computed differently
+ALIAS_VERSION = 1
+
+
+def load_aliases(path: str) -> Dict:
+    """{"aliases": {identity: {xmlid: [names]}}, "derived": {names}}, empty if missing/unreadable/old"""
+    table = {"aliases": {}, "derived": set()}
+    if not os.path.exists(path):
+        return table
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, IOError, ValueError):
+        return table
+    if data.get("version") != ALIAS_VERSION:
+        return table
+    table["aliases"] = data.get("aliases", {})
+    table["derived"] = set(data.get("derived", []))
+    return table
+
+
+def save_aliases(path: str, table: Dict):
+    """Write the alias table"""
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": ALIAS_VERSION,
+                "aliases": table["aliases"],
+                "derived": sorted(table["derived"]),
+            }, f, indent=2, ensure_ascii=False)
+    except OSError as e:
+        print(f"    [WARN] Could not save alias table {path}: {e}")
+
+
+def learn(table: Dict, identity: Optional[str], name: str, xml_id: str) -> bool:
+    """
+    Record that confirmed playlist name maps to xml_id. A name votes for
+    one XMLID at a time, and alias-derived names don't vote. Returns True
+    if the table changed.
+    """
+    if not identity or name in table["derived"]:
+        return False
+    votes = table["aliases"].setdefault(identity, {})
+    if name in votes.get(xml_id, ()):
+        return False
+    for other_id in list(votes):
+        if name in votes[other_id]:
+            votes[other_id].remove(name)
+            if not votes[other_id]:
+                del votes[other_id]
+    votes.setdefault(xml_id, []).append(name)
+    return True
+
+
+def resolve(table: Dict, identity: Optional[str], valid_ids: Set[str], min_votes: int = 1) -> Optional[str]:
+    """The identity's XMLID if enough confirmed names agree on it, none disagree, and it is still valid"""
+    votes = table["aliases"].get(identity) if identity else None
+    # Votes for IDs that left the reference EPG neither count nor conflict
+    votes = {xml_id: names for xml_id, names in (votes or {}).items() if xml_id in valid_ids}
+    if len(votes) != 1:
+        return None
+    xml_id, names = next(iter(votes.items()))
+    if len(names) < min_votes:
+        return None
+    return xml_id
+
+
+def mark_derived(table: Dict, name: str):
+    """Remember that name was resolved through another name's decision, so it never votes"""
+    table["derived"].add(name)
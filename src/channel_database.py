@@ -765,3 +765,48 @@ def lookup_channel(raw_name):
             return xmlid, 95
     
     return None, 0
+
+
+# Superscript quality markers seen in IPTV names (same set as main.extract_core_name)
+SUPERSCRIPT_MARKERS = 'ᴴᴰᵁᴴᴰ⁴ᴷˢᵈ¹⁰⁸⁰ᵖᶜᴿᵃᴰ'
+QUALITY_WORDS = r'\b(HD|SD|UHD|4K|FHD|1080P|720P|HEVC|H264|H265)\b'
+
+
+def canonical_key(name):
+    """
+    Canonical form of a channel name for exact matching:
+    normalize_channel_name(), then drop superscript markers, accents,
+    quality words (HD/FHD/HEVC/...) and punctuation, and upper-case.
+    "US| CNN ᴴᴰ", "cnn hd" and "CNN" all give "CNN".
+    """
+    import re
+    import unicodedata
+    
+    name = normalize_channel_name(name)
+    name = ''.join(c for c in name if c not in SUPERSCRIPT_MARKERS)
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    name = name.upper()
+    name = re.sub(QUALITY_WORDS, ' ', name)
+    name = re.sub(r'[^A-Z0-9]+', ' ', name)
+    return ' '.join(name.split())
+
+
+def build_key_index(reference_map):
+    """
+    {canonical_key: xmlid} over {display_name: xmlid}.
+    Keys shared by names with different IDs are left out so they
+    fall through to fuzzy matching instead of picking one blindly.
+    """
+    index = {}
+    ambiguous = set()
+    for display_name, xmlid in reference_map.items():
+        key = canonical_key(display_name)
+        if not key or key in ambiguous:
+            continue
+        if key in index and index[key] != xmlid:
+            del index[key]
+            ambiguous.add(key)
+            continue
+        index[key] = xmlid
+    return index
@@ -4,11 +4,19 @@ Handles downloading, caching, and parsing EPG XML files
 """
 import os
 import gzip
+import json
+import re
+import zlib
+import pickle
+import hashlib
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from lxml import etree
-from typing import Dict, Set, Tuple, List, Callable, Optional
+from typing import Dict, Set, Tuple, List, Callable, Optional, Union
+import epg_sources
+import reference_store
 
 
 def get_cache_age_hours(cache_path: str) -> float:
@@ -21,50 +29,456 @@ def get_cache_age_hours(cache_path: str) -> float:
     return age_seconds / 3600
 
 
-def download_file(url: str, dest_path: str, timeout: int = 60) -> bool:
-    """Download a file with progress indication"""
+VALIDATOR_SUFFIX = ".meta.json"
+
+
+def validator_path(cache_path: str) -> str:
+    """Sidecar path holding the HTTP validators (ETag/Last-Modified) for a cached file"""
+    return cache_path + VALIDATOR_SUFFIX
+
+
+def load_validators(cache_path: str, url: str) -> Dict[str, str]:
+    """Return the stored validators for cache_path, or {} if none apply to url"""
+    path = validator_path(cache_path)
+    if not os.path.exists(path) or not os.path.exists(cache_path):
+        return {}
     try:
-        print(f"    Downloading: {url[:60]}...")
-        response = requests.get(url, timeout=timeout, stream=True)
-        response.raise_for_status()
-        
-        total_size = int(response.headers.get('content-length', 0))
-        downloaded = 0
-        
-        with open(dest_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-        
-        size_mb = os.path.getsize(dest_path) / (1024 * 1024)
-        print(f"    [OK] Downloaded: {size_mb:.1f} MB")
-        return True
-        
-    except Exception as e:
-        print(f"    [FAIL] Download failed: {e}")
+        with open(path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (json.JSONDecodeError, IOError, ValueError):
+        return {}
+    if meta.get('url') != url:
+        return {}
+    return meta
+
+
+def save_validators(cache_path: str, url: str, response: requests.Response):
+    """Store the validators from a successful response next to the cached file"""
+    meta = {'url': url}
+    if response.headers.get('ETag'):
+        meta['etag'] = response.headers['ETag']
+    if response.headers.get('Last-Modified'):
+        meta['last_modified'] = response.headers['Last-Modified']
+    try:
+        _write_json_atomic(validator_path(cache_path), meta)
+    except OSError as e:
+        print(f"    [WARN] Could not save validators for {cache_path}: {e}")
+
+
+def _load_meta(cache_path: str) -> Dict:
+    """Raw validator sidecar contents, {} if missing/unreadable"""
+    path = validator_path(cache_path)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError, ValueError):
+        return {}
+
+
+def mark_verified(cache_path: str):
+    """Record that cache_path (at its current size/mtime) passed verify_epg_file"""
+    meta = _load_meta(cache_path)
+    stat = os.stat(cache_path)
+    meta['verified'] = [stat.st_size, stat.st_mtime]
+    try:
+        _write_json_atomic(validator_path(cache_path), meta)
+    except OSError:
+        pass
+
+
+def is_verified(cache_path: str) -> bool:
+    """True if cache_path is unchanged since it last passed verification"""
+    verified = _load_meta(cache_path).get('verified')
+    if not verified or not os.path.exists(cache_path):
         return False
+    stat = os.stat(cache_path)
+    return verified == [stat.st_size, stat.st_mtime]
 
 
-def parse_epg_channels(file_path: str, is_dummy_callback: Optional[Callable] = None) -> Tuple[Dict[str, str], Set[str]]:
+def mark_content(cache_path: str, sha1: str):
+    """Record the SHA-1 of cache_path's contents (at its current size/mtime)"""
+    meta = _load_meta(cache_path)
+    stat = os.stat(cache_path)
+    meta['content'] = [stat.st_size, stat.st_mtime, sha1]
+    try:
+        _write_json_atomic(validator_path(cache_path), meta)
+    except OSError:
+        pass
+
+
+def content_identity(cache_path: str) -> Optional[List]:
+    """[size, sha1] of cache_path if recorded since it last changed, else None"""
+    content = _load_meta(cache_path).get('content')
+    if not content or not os.path.exists(cache_path):
+        return None
+    stat = os.stat(cache_path)
+    if content[:2] != [stat.st_size, stat.st_mtime]:
+        return None
+    return [content[0], content[2]]
+
+
+def _touch_cache(cache_path: str):
     """
-    Parse an EPG XML file and extract channel information.
+    Mark an unchanged cache file as fresh. The parsed snapshot, the
+    verified marker and the content hash are carried over to the new
+    mtime so the 304 doesn't cost a re-hash, re-verify or re-parse.
+    """
+    was_verified = is_verified(cache_path)
+    content = content_identity(cache_path)
+    old_mtime = os.path.getmtime(cache_path)
+    os.utime(cache_path, None)
+    if was_verified:
+        mark_verified(cache_path)
+    if content:
+        mark_content(cache_path, content[1])
+    
+    snap_path = snapshot_path(cache_path)
+    if not os.path.exists(snap_path):
+        return
+    try:
+        with open(snap_path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        if snapshot.get('mtime') == old_mtime and snapshot.get('size') == os.path.getsize(cache_path):
+            snapshot['mtime'] = os.path.getmtime(cache_path)
+            _write_json_atomic(snap_path, snapshot)
+    except (json.JSONDecodeError, IOError, ValueError):
+        pass
+
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+PARTIAL_SUFFIX = ".part"
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def _verify_transfer(part_path: str, expected_size: Optional[int]) -> Optional[str]:
+    """Return a reason string if a finished transfer looks incomplete, else None"""
+    actual_size = os.path.getsize(part_path)
+    if expected_size is not None and actual_size != expected_size:
+        return f"size {actual_size:,} bytes, expected {expected_size:,}"
+    if actual_size == 0:
+        return "empty file"
+    if part_path.endswith('.gz' + PARTIAL_SUFFIX):
+        with open(part_path, 'rb') as f:
+            if f.read(2) != GZIP_MAGIC:
+                return "not a gzip file"
+    return None
+
+
+def _check_xml_shape(head: bytes, tail: bytes) -> Optional[str]:
+    """Cheap structure check on the first/last bytes of an XMLTV document"""
+    start = head.lstrip(b'\xef\xbb\xbf \t\r\n')
+    if not start.startswith((b'<?xml', b'<tv', b'<!DOCTYPE')):
+        return "does not look like XMLTV"
+    if not tail.rstrip().endswith(b'</tv>'):
+        return "XML is truncated (no closing </tv>)"
+    return None
+
+
+def verify_epg_file(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, gzipped: Optional[bool] = None) -> Optional[str]:
+    """
+    Stream through a cached EPG file and check it is intact: the whole
+    gzip stream inflates with a matching CRC32/length trailer, and the
+    XML starts like XMLTV and ends with </tv>. Much cheaper than a parse.
+    gzipped defaults to the .gz extension (pass it for .part files).
     
     Returns:
-        Tuple of (reference_data dict, valid_ids set)
-        - reference_data: {display_name: xmlid}
-        - valid_ids: set of all valid channel IDs
+        A problem description, or None if the file looks good
+    """
+    head = b''
+    tail = b''
+    try:
+        if gzipped is None:
+            gzipped = path.endswith('.gz')
+        opener = gzip.open if gzipped else open
+        with opener(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                if len(head) < 256:
+                    head += chunk[:256 - len(head)]
+                tail = (tail + chunk)[-256:]
+    except (OSError, EOFError, zlib.error) as e:
+        return f"bad gzip stream: {e}"
+    return _check_xml_shape(head, tail)
+
+
+def is_epg_path(path: str) -> bool:
+    """True for the XMLTV files (.xml / .xml.gz) that get integrity checks"""
+    return path.endswith(('.xml', '.xml.gz'))
+
+
+QUARANTINE_DIR = "quarantine"
+QUARANTINE_KEEP = 10
+
+
+def quarantine_file(path: str, reason: str) -> Optional[str]:
+    """Move a corrupt file into <cache_dir>/quarantine/ for inspection. Returns its new path."""
+    if not os.path.exists(path):
+        return None
+    quarantine_dir = os.path.join(os.path.dirname(path) or '.', QUARANTINE_DIR)
+    os.makedirs(quarantine_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    target = os.path.join(quarantine_dir, f"{os.path.basename(path)}.{stamp}")
+    try:
+        os.replace(path, target)
+    except OSError as e:
+        print(f"    [WARN] Could not quarantine {path}: {e}")
+        return None
+    print(f"    [WARN] Quarantined {os.path.basename(path)} ({reason}) -> {target}")
+    
+    # Keep only the most recent few
+    entries = sorted(
+        (os.path.join(quarantine_dir, name) for name in os.listdir(quarantine_dir)),
+        key=os.path.getmtime, reverse=True
+    )
+    for old in entries[QUARANTINE_KEEP:]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return target
+
+
+def _discard_partial(part_path: str):
+    """Remove a partial download and its validators"""
+    for path in (part_path, validator_path(part_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def download_file(
+    url: str,
+    dest_path: str,
+    timeout: int = 60,
+    conditional: bool = True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    retries: int = 3,
+    sink: Optional['StreamingChannelParser'] = None
+) -> bool:
+    """
+    Download a file with progress indication.
+    
+    The body is streamed into dest_path + ".part" and only renamed over
+    dest_path once the transfer is complete and verified, so an
+    interrupted download never replaces a good cache. A leftover .part
+    is resumed with an HTTP Range request (guarded by If-Range) on the
+    next attempt or the next run.
+    
+    When conditional is True and validators from a previous download are
+    stored next to dest_path, the request carries If-None-Match /
+    If-Modified-Since. A 304 response just touches the cached file.
+    
+    If a sink is given, every byte of the file (including a resumed
+    partial) is also fed to it as it is written.
+    """
+    part_path = dest_path + PARTIAL_SUFFIX
+    print(f"    Downloading: {url[:60]}...")
+    
+    for attempt in range(1, retries + 1):
+        try:
+            headers = {}
+            resume_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            
+            if resume_from:
+                # Resume the partial body, but only if upstream still has the same version
+                partial_validators = load_validators(part_path, url)
+                if_range = partial_validators.get('etag') or partial_validators.get('last_modified')
+                if if_range:
+                    headers['Range'] = f"bytes={resume_from}-"
+                    headers['If-Range'] = if_range
+                else:
+                    _discard_partial(part_path)
+                    resume_from = 0
+            elif conditional:
+                validators = load_validators(dest_path, url)
+                if validators.get('etag'):
+                    headers['If-None-Match'] = validators['etag']
+                if validators.get('last_modified'):
+                    headers['If-Modified-Since'] = validators['last_modified']
+            
+            response = requests.get(url, timeout=timeout, stream=True, headers=headers)
+            
+            if response.status_code == 304 and os.path.exists(dest_path):
+                response.close()
+                _touch_cache(dest_path)
+                print(f"    [OK] Not modified: {os.path.basename(dest_path)}")
+                return True
+            
+            if response.status_code == 416:
+                # Our partial no longer fits upstream - start over
+                response.close()
+                _discard_partial(part_path)
+                continue
+            
+            response.raise_for_status()
+            
+            content_length = response.headers.get('content-length')
+            encoded = bool(response.headers.get('content-encoding'))
+            if resume_from and response.status_code == 206:
+                mode = 'ab'
+                content_range = response.headers.get('content-range', '')
+                total = content_range.rsplit('/', 1)[-1]
+                expected_size = int(total) if total.isdigit() else None
+                print(f"    Resuming {os.path.basename(dest_path)} at {resume_from / (1024 * 1024):.1f} MB")
+            else:
+                mode = 'wb'
+                expected_size = int(content_length) if content_length and not encoded else None
+                save_validators(part_path, url, response)
+            
+            if sink is not None:
+                sink.reset()
+                if mode == 'ab':
+                    with open(part_path, 'rb') as f:
+                        for chunk in iter(lambda: f.read(chunk_size), b''):
+                            sink.feed(chunk)
+            
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        if sink is not None:
+                            sink.feed(chunk)
+            
+            problem = _verify_transfer(part_path, expected_size)
+            if problem:
+                # A complete-looking but wrong file can't be resumed; retry from zero
+                print(f"    [WARN] Incomplete download ({problem}) - retrying")
+                _discard_partial(part_path)
+                continue
+            
+            if is_epg_path(dest_path):
+                # CRC/structure check - a streamed download was checked on the fly
+                if sink is not None:
+                    problem = sink.integrity_problem()
+                else:
+                    problem = verify_epg_file(part_path, chunk_size, gzipped=dest_path.endswith('.gz'))
+                if problem:
+                    quarantine_file(part_path, problem)
+                    _discard_partial(part_path)
+                    continue
+            
+            os.replace(part_path, dest_path)
+            save_validators(dest_path, url, response)
+            if is_epg_path(dest_path):
+                mark_verified(dest_path)
+            _discard_partial(part_path)
+            
+            size_mb = os.path.getsize(dest_path) / (1024 * 1024)
+            print(f"    [OK] Downloaded: {size_mb:.1f} MB")
+            return True
+            
+        except Exception as e:
+            if attempt < retries:
+                print(f"    [WARN] Download attempt {attempt}/{retries} failed: {e} - retrying")
+                time.sleep(2 * attempt)
+            else:
+                print(f"    [FAIL] Download failed: {e}")
+                return False
+    
+    print(f"    [FAIL] Download failed: could not get a complete copy of {os.path.basename(dest_path)}")
+    return False
+
+
+# Source layouts recorded in snapshots
+LAYOUT_CHANNELS_FIRST = "channels_first"
+LAYOUT_INTERLEAVED = "interleaved"
+# A channels-first layout is re-verified with a full scan this often
+LAYOUT_RECHECK_DAYS = 7
+
+# Regions the matcher partitions reference data by, matched against the
+# start of an XMLID's last dotted part (.us, .us_locals1, .ca2, ...)
+REGIONS = ('us', 'ca', 'uk')
+
+
+def id_region(xmlid: str) -> Optional[str]:
+    """Region of an XMLID from REGIONS, or None"""
+    suffix = xmlid.rsplit('.', 1)[-1] if '.' in xmlid else ''
+    for region in REGIONS:
+        if suffix.startswith(region):
+            return region
+    return None
+
+
+def partition_ids(valid_ids: Set[str]) -> Dict[str, Set[str]]:
+    """Split channel IDs into {region: ids} (IDs outside REGIONS are left out)"""
+    region_ids = {region: set() for region in REGIONS}
+    for xmlid in valid_ids:
+        region = id_region(xmlid)
+        if region:
+            region_ids[region].add(xmlid)
+    return region_ids
+
+
+class MarkupError(ValueError):
+    """
+    A source only parsed with libxml2's error recovery, so channels may be
+    missing. result holds what was recovered, as scan_epg_channels() returns it.
+    """
+    
+    def __init__(self, message: str, result: Tuple):
+        super().__init__(message)
+        self.result = result
+
+
+def scan_epg_channels(
+    file_path: str,
+    is_dummy_callback: Optional[Callable] = None,
+    channels_only: bool = False,
+    strict: bool = False
+) -> Tuple[Dict[str, str], Set[str], Optional[str], Dict[str, Set[str]]]:
+    """
+    Scan an EPG XML file for <channel> elements.
+    
+    With channels_only=True the scan stops at the first <programme>,
+    which for XMLTV files that list every channel up front skips nearly
+    all of the inflate/parse work. A full scan also reports the layout
+    it saw, so callers know whether early exit is safe for this source.
+    
+    Markup errors such as an unescaped "&" are recovered from (libxml2
+    recover mode) and other parse errors return whatever was read so far;
+    both are printed. With strict=True, a corrupt file (bad gzip stream,
+    truncated document) raises instead, and a recovered parse raises
+    MarkupError carrying its result, so the caller can decide whether to
+    trust it.
+    
+    Returns:
+        Tuple of (reference_data, valid_ids, layout, region_ids)
+        - layout: LAYOUT_CHANNELS_FIRST / LAYOUT_INTERLEAVED from a full
+          scan, None for an early-exit scan or a failed parse
+        - region_ids: {region: ids} for REGIONS, classified as each channel is read
     """
     reference_data = {}
     valid_ids = set()
+    region_ids = {region: set() for region in REGIONS}
+    seen_programme = False
+    interleaved = False
+    complete = False
+    markup_problem = None
     
     try:
         opener = gzip.open if file_path.endswith('.gz') else open
         
         with opener(file_path, 'rb') as f:
-            context = etree.iterparse(f, events=('end',), tag='channel')
+            context = etree.iterparse(f, events=('start', 'end'), tag=('channel', 'programme'), recover=True)
             
             for event, elem in context:
+                if elem.tag == 'programme':
+                    if event == 'start':
+                        if channels_only:
+                            break
+                        seen_programme = True
+                    else:
+                        elem.clear()
+                        while elem.getprevious() is not None:
+                            del elem.getparent()[0]
+                    continue
+                
+                if event == 'start':
+                    continue
+                
+                if seen_programme:
+                    interleaved = True
+                
                 channel_id = elem.get('id', '')
                 
                 # Skip bad/dummy IDs
@@ -74,6 +488,9 @@ def parse_epg_channels(file_path: str, is_dummy_callback: Optional[Callable] = N
                 
                 if channel_id:
                     valid_ids.add(channel_id)
+                    region = id_region(channel_id)
+                    if region:
+                        region_ids[region].add(channel_id)
                     
                     # Get all display names for this channel
                     for display_name_elem in elem.findall('display-name'):
@@ -87,78 +504,945 @@ def parse_epg_channels(file_path: str, is_dummy_callback: Optional[Callable] = N
                 elem.clear()
                 while elem.getprevious() is not None:
                     del elem.getparent()[0]
+            else:
+                complete = True
+            
+            errors = context.error_log.filter_from_errors()
+            if errors:
+                markup_problem = str(errors[0])
                     
+    except etree.XMLSyntaxError as e:
+        markup_problem = str(e)
     except Exception as e:
         print(f"    [FAIL] Error parsing {file_path}: {e}")
+        if strict:
+            raise
+    
+    if channels_only or not complete or markup_problem:
+        layout = None
+    else:
+        layout = LAYOUT_INTERLEAVED if interleaved else LAYOUT_CHANNELS_FIRST
+    
+    if markup_problem:
+        problem = verify_epg_file(file_path) if strict else None
+        if problem:
+            print(f"    [FAIL] Error parsing {file_path}: {problem}")
+            raise ValueError(problem)
+        print(f"    [WARN] XML error in {file_path}: {markup_problem} - recovered {len(valid_ids):,} channel IDs")
+        if strict:
+            raise MarkupError(markup_problem, (reference_data, valid_ids, layout, region_ids))
+    return reference_data, valid_ids, layout, region_ids
+
+
+def parse_epg_channels(file_path: str, is_dummy_callback: Optional[Callable] = None) -> Tuple[Dict[str, str], Set[str]]:
+    """
+    Parse an EPG XML file and extract channel information.
     
+    Returns:
+        Tuple of (reference_data dict, valid_ids set)
+        - reference_data: {display_name: xmlid}
+        - valid_ids: set of all valid channel IDs
+    """
+    reference_data, valid_ids, _, _ = scan_epg_channels(file_path, is_dummy_callback)
     return reference_data, valid_ids
 
 
+class StreamingChannelParser:
+    """
+    Incremental gzip + XMLTV channel parser fed straight from a download.
+    
+    download_file() hands every chunk it writes to feed(), so the channel
+    index (and the file's SHA-1 for its snapshot) is ready as soon as the
+    transfer finishes, without reopening and re-inflating the file. Same
+    output and first-occurrence rules as scan_epg_channels().
+    
+    lxml parsers must not cross threads, so reset(), feed() and finish()
+    all have to run on the downloading thread; the result is left in
+    self.result for the caller.
+    """
+    
+    def __init__(self, is_dummy_callback: Optional[Callable] = None, gzipped: bool = True, channels_only: bool = False):
+        self.is_dummy_callback = is_dummy_callback
+        self.gzipped = gzipped
+        self.channels_only = channels_only
+        self._parser = None
+        self.bytes_fed = 0
+        self.result = None
+    
+    def reset(self):
+        """Start (or restart, if the download restarted from zero) a fresh parse"""
+        self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS) if self.gzipped else None
+        self._parser = etree.XMLPullParser(events=('start', 'end'), tag=('channel', 'programme'))
+        self._sha1 = hashlib.sha1()
+        self.reference_data = {}
+        self.valid_ids = set()
+        self.region_ids = {region: set() for region in REGIONS}
+        self.bytes_fed = 0
+        self._head = b''
+        self._tail = b''
+        self._seen_programme = False
+        self._interleaved = False
+        self._stopped = False
+        self.error = None
+        self.markup_error = None
+    
+    def feed(self, chunk: bytes):
+        """Consume the next raw (still compressed) chunk of the file"""
+        if self._parser is None:
+            self.reset()
+        self._sha1.update(chunk)
+        self.bytes_fed += len(chunk)
+        if self.error:
+            return
+        try:
+            data = self._inflate(chunk)
+        except Exception as e:
+            self.error = e
+            return
+        if len(self._head) < 256:
+            self._head += data[:256 - len(self._head)]
+        self._tail = (self._tail + data[-256:])[-256:]
+        # After an early exit keep inflating (for the CRC check) but stop parsing
+        if not self._stopped:
+            try:
+                self._feed_xml(data)
+            except etree.XMLSyntaxError as e:
+                # Bad markup doesn't make the file corrupt, but this parse
+                # can't recover - leave it to the parse from disk
+                self.markup_error = e
+                self._stopped = True
+            except Exception as e:
+                self.error = e
+    
+    def integrity_problem(self) -> Optional[str]:
+        """Same checks as verify_epg_file(), on the bytes fed so far"""
+        if self.error:
+            return f"stream error: {self.error}"
+        if self._inflater is not None and not self._inflater.eof:
+            return "gzip stream ended early"
+        return _check_xml_shape(self._head, self._tail)
+    
+    def _inflate(self, chunk: bytes) -> bytes:
+        if self._inflater is None:
+            return chunk
+        data = self._inflater.decompress(chunk)
+        # Concatenated gzip members: start a new inflater on the leftover bytes
+        while self._inflater.eof and self._inflater.unused_data:
+            leftover = self._inflater.unused_data
+            self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            data += self._inflater.decompress(leftover)
+        return data
+    
+    def _feed_xml(self, data: bytes):
+        if not data:
+            return
+        self._parser.feed(data)
+        for event, elem in self._parser.read_events():
+            if elem.tag == 'programme':
+                if event == 'start':
+                    if self.channels_only:
+                        self._stopped = True
+                        return
+                    self._seen_programme = True
+                else:
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+                continue
+            
+            if event == 'start':
+                continue
+            
+            if self._seen_programme:
+                self._interleaved = True
+            
+            channel_id = elem.get('id', '')
+            if self.is_dummy_callback and self.is_dummy_callback(channel_id):
+                elem.clear()
+                continue
+            
+            if channel_id:
+                self.valid_ids.add(channel_id)
+                region = id_region(channel_id)
+                if region:
+                    self.region_ids[region].add(channel_id)
+                for display_name_elem in elem.findall('display-name'):
+                    if display_name_elem.text:
+                        display_name = display_name_elem.text.strip()
+                        if display_name not in self.reference_data:
+                            self.reference_data[display_name] = channel_id
+            
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    
+    def finish(self) -> Optional[Tuple[Dict[str, str], Set[str], Optional[str], str, Dict[str, Set[str]]]]:
+        """
+        Close the parser once the download is over and release it.
+        
+        Returns (and stores in self.result):
+            (reference_data, valid_ids, layout, sha1, region_ids), or None if nothing was
+            streamed (e.g. a 304) or the stream couldn't be parsed cleanly
+        """
+        self.result = None
+        if self._parser is None or self.bytes_fed == 0:
+            self._parser = None
+            return None
+        if not self._stopped and not self.error:
+            try:
+                if self._inflater is not None and not self._inflater.eof:
+                    raise ValueError("gzip stream ended early")
+                self._parser.close()
+            except etree.XMLSyntaxError as e:
+                self.markup_error = e
+                self._stopped = True
+            except Exception as e:
+                self.error = e
+        self._parser = None
+        self._inflater = None
+        if self.error or self.markup_error:
+            print(f"    [WARN] Streaming parse failed ({self.error or self.markup_error}) - will parse from disk")
+            return None
+        
+        if self._stopped:
+            layout = None
+        else:
+            layout = LAYOUT_INTERLEAVED if self._interleaved else LAYOUT_CHANNELS_FIRST
+        self.result = (self.reference_data, self.valid_ids, layout, self._sha1.hexdigest(), self.region_ids)
+        return self.result
+
+
+# Bump when the snapshot layout or parse_epg_channels output changes
+SNAPSHOT_VERSION = 2
+SNAPSHOT_SUFFIX = ".index.json"
+
+
+def _file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-1 of a file's contents, read in chunks"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def callback_fingerprint(callback: Optional[Callable]) -> str:
+    """
+    Identify a dummy-ID callback so snapshots parsed with a different
+    filter are not reused. Uses the function's name plus its bytecode
+    and constants, so editing the callback body also invalidates.
+    """
+    if callback is None:
+        return "none"
+    code = getattr(callback, '__code__', None)
+    name = f"{getattr(callback, '__module__', '')}.{getattr(callback, '__qualname__', type(callback).__qualname__)}"
+    if code is None:
+        return name
+    digest = hashlib.sha1(code.co_code)
+    digest.update(repr(code.co_consts).encode('utf-8', 'replace'))
+    return f"{name}:{digest.hexdigest()[:16]}"
+
+
+def snapshot_path(cache_path: str) -> str:
+    """Sidecar path holding the parsed channel index for a cached source"""
+    return cache_path + SNAPSHOT_SUFFIX
+
+
+def load_channel_snapshot(
+    cache_path: str,
+    callback_fp: str,
+    allow_stale: bool = False
+) -> Optional[Tuple[Dict[str, str], Set[str], Dict[str, Set[str]]]]:
+    """
+    Load the parsed channel index for cache_path if the source is unchanged.
+    
+    The snapshot is trusted when size and mtime match. If only the mtime
+    moved (e.g. the file was re-downloaded with identical content), the
+    content hash decides. Returns None when the snapshot is missing or stale.
+    
+    allow_stale=True skips the file checks and returns the last good
+    index even if the file changed or is gone (corrupt-source fallback).
+    
+    Returns:
+        Tuple of (reference_data, valid_ids, region_ids), or None
+    """
+    path = snapshot_path(cache_path)
+    if not os.path.exists(path) or not (allow_stale or os.path.exists(cache_path)):
+        return None
+    
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (json.JSONDecodeError, IOError, ValueError):
+        return None
+    
+    if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('callback') != callback_fp:
+        return None
+    
+    if allow_stale:
+        return _snapshot_index(snapshot)
+    
+    stat = os.stat(cache_path)
+    if snapshot.get('size') != stat.st_size:
+        return None
+    
+    if snapshot.get('mtime') != stat.st_mtime:
+        if snapshot.get('sha1') != _file_hash(cache_path):
+            return None
+        # Same content, newer mtime - remember it so the next run skips hashing
+        snapshot['mtime'] = stat.st_mtime
+        _write_json_atomic(path, snapshot)
+    
+    if content_identity(cache_path) is None:
+        mark_content(cache_path, snapshot['sha1'])
+    return _snapshot_index(snapshot)
+
+
+def _snapshot_index(snapshot: Dict) -> Tuple[Dict[str, str], Set[str], Dict[str, Set[str]]]:
+    region_ids = {region: set(snapshot['region_ids'].get(region, ())) for region in REGIONS}
+    return snapshot['reference_data'], set(snapshot['valid_ids']), region_ids
+
+
+def load_source_layout(cache_path: str) -> Dict:
+    """
+    Return the layout recorded by the last snapshot for cache_path, even
+    if the snapshot itself is stale - feeds keep their layout between
+    refreshes. {} when nothing is known yet.
+    """
+    path = snapshot_path(cache_path)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (json.JSONDecodeError, IOError, ValueError):
+        return {}
+    if not snapshot.get('layout'):
+        return {}
+    return {'layout': snapshot['layout'], 'layout_checked': snapshot.get('layout_checked', 0)}
+
+
+def save_channel_snapshot(
+    cache_path: str,
+    callback_fp: str,
+    reference_data: Dict[str, str],
+    valid_ids: Set[str],
+    layout: Optional[Dict] = None,
+    sha1: Optional[str] = None,
+    region_ids: Optional[Dict[str, Set[str]]] = None
+):
+    """
+    Write the parsed channel index (and known source layout) for cache_path
+    next to it. Pass sha1 if it is already known to skip re-reading the file,
+    and region_ids if the parse already classified the IDs.
+    """
+    try:
+        stat = os.stat(cache_path)
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'callback': callback_fp,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha1': sha1 or _file_hash(cache_path),
+            'reference_data': reference_data,
+            'valid_ids': sorted(valid_ids),
+            'region_ids': {region: sorted(ids) for region, ids in (region_ids or partition_ids(valid_ids)).items()},
+        }
+        if layout:
+            snapshot.update(layout)
+        _write_json_atomic(snapshot_path(cache_path), snapshot)
+        mark_content(cache_path, snapshot['sha1'])
+    except (OSError, TypeError, ValueError) as e:
+        print(f"    [WARN] Could not save index snapshot for {cache_path}: {e}")
+
+
+def _write_json_atomic(path: str, data):
+    """Write JSON to a temp file and rename it into place"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def parse_and_snapshot(
+    cache_path: str,
+    is_dummy_callback: Optional[Callable] = None,
+    early_exit: bool = True
+) -> Tuple[Dict[str, str], Set[str], Dict[str, Set[str]]]:
+    """
+    Parse a cached source and save its snapshot. Module-level so process pools can run it.
+    
+    With early_exit, sources whose last full scan showed every channel
+    before the first programme are scanned only up to that programme.
+    Sources never scanned before, known to interleave, or due for a
+    layout re-check get a full scan.
+    
+    Files not already verified are integrity-checked first. A corrupt
+    file (bad gzip stream, truncated document) is quarantined and the last
+    good snapshot is used instead, so a broken feed can't silently shrink
+    valid_ids. A file with markup errors stays in place for Step 6; its
+    recovered channels are used unless the last good snapshot has more
+    IDs, and never saved as a snapshot.
+    
+    Returns:
+        Tuple of (reference_data, valid_ids, region_ids)
+    """
+    callback_fp = callback_fingerprint(is_dummy_callback)
+    
+    if not is_verified(cache_path):
+        problem = verify_epg_file(cache_path)
+        if problem:
+            return _last_good_index(cache_path, callback_fp, problem)
+        mark_verified(cache_path)
+    
+    channels_only, known = choose_scan_mode(cache_path, early_exit)
+    try:
+        ref_data, valid_ids, layout, region_ids = scan_epg_channels(
+            cache_path, is_dummy_callback, channels_only=channels_only, strict=True
+        )
+    except MarkupError as e:
+        return _recovered_index(cache_path, callback_fp, e.result)
+    except Exception as e:
+        return _last_good_index(cache_path, callback_fp, f"corrupt: {e}")
+    
+    if ref_data or valid_ids:
+        save_channel_snapshot(
+            cache_path, callback_fp, ref_data, valid_ids,
+            update_layout(cache_path, known, layout), region_ids=region_ids
+        )
+    return ref_data, valid_ids, region_ids
+
+
+def _last_good_index(cache_path: str, callback_fp: str, problem: str) -> Tuple[Dict[str, str], Set[str], Dict[str, Set[str]]]:
+    """Quarantine a corrupt cached source and fall back to its last good snapshot"""
+    quarantine_file(cache_path, problem)
+    cached = load_channel_snapshot(cache_path, callback_fp, allow_stale=True)
+    if cached is None:
+        print(f"    [FAIL] No last-good index for {os.path.basename(cache_path)} - source skipped")
+        return {}, set(), {region: set() for region in REGIONS}
+    print(f"    [OK] Using last-good index for {os.path.basename(cache_path)} ({len(cached[1]):,} channel IDs)")
+    return cached
+
+
+def _recovered_index(
+    cache_path: str,
+    callback_fp: str,
+    recovered: Tuple
+) -> Tuple[Dict[str, str], Set[str], Dict[str, Set[str]]]:
+    """The channels of a recovered parse, or the last good snapshot if it has more IDs"""
+    ref_data, valid_ids, _, region_ids = recovered
+    cached = load_channel_snapshot(cache_path, callback_fp, allow_stale=True)
+    if cached is not None and len(cached[1]) > len(valid_ids):
+        print(f"    [OK] Using last-good index for {os.path.basename(cache_path)} "
+              f"({len(cached[1]):,} channel IDs, recovered parse found {len(valid_ids):,})")
+        return cached
+    return ref_data, valid_ids, region_ids
+
+
+def choose_scan_mode(cache_path: str, early_exit: bool = True) -> Tuple[bool, Dict]:
+    """
+    Decide whether a source can be scanned channels-only.
+    
+    Returns:
+        Tuple of (channels_only, known layout record)
+    """
+    known = load_source_layout(cache_path)
+    recheck_due = time.time() - known.get('layout_checked', 0) > LAYOUT_RECHECK_DAYS * 86400
+    channels_only = early_exit and known.get('layout') == LAYOUT_CHANNELS_FIRST and not recheck_due
+    return channels_only, known
+
+
+def update_layout(cache_path: str, known: Dict, layout: Optional[str]) -> Dict:
+    """Fold the layout seen by a full scan (if any) into the known layout record"""
+    if not layout:
+        return known
+    if layout == LAYOUT_INTERLEAVED and known.get('layout') != layout:
+        print(f"    [INFO] {os.path.basename(cache_path)} interleaves channels and programmes - full scans only")
+    return {'layout': layout, 'layout_checked': time.time()}
+
+
+def default_parse_workers() -> int:
+    """Worker count used when PARSE_WORKERS is 0/auto: one per core, capped at 4 to spare RAM"""
+    return max(1, min(os.cpu_count() or 1, 4))
+
+
+def parse_sources(
+    cache_paths: List[str],
+    is_dummy_callback: Optional[Callable] = None,
+    max_workers: int = 1,
+    early_exit: bool = True
+) -> Dict[str, Tuple[Dict[str, str], Set[str], Dict[str, Set[str]], float]]:
+    """
+    Parse several cached sources, each in its own worker process when
+    max_workers > 1. Falls back to parsing serially in this process if
+    there is only one file, the callback can't be pickled, or the pool
+    can't be started.
+    
+    Returns:
+        {cache_path: (reference_data, valid_ids, region_ids, parse_seconds)}
+    """
+    results = {}
+    workers = min(max_workers, len(cache_paths))
+    
+    if workers > 1:
+        try:
+            pickle.dumps(is_dummy_callback)
+        except Exception:
+            print("    [WARN] Dummy-ID callback can't be sent to worker processes - parsing serially")
+            workers = 1
+    
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(_timed_parse, path, is_dummy_callback, early_exit): path for path in cache_paths}
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+            return results
+        except Exception as e:
+            print(f"    [WARN] Parallel parse failed ({e}) - parsing serially")
+            results = {}
+    
+    for path in cache_paths:
+        results[path] = _timed_parse(path, is_dummy_callback, early_exit)
+    return results
+
+
+def _timed_parse(
+    cache_path: str,
+    is_dummy_callback: Optional[Callable],
+    early_exit: bool
+) -> Tuple[Dict[str, str], Set[str], Dict[str, Set[str]], float]:
+    """parse_and_snapshot plus its wall time, measured inside the worker"""
+    started = time.perf_counter()
+    ref_data, valid_ids, region_ids = parse_and_snapshot(cache_path, is_dummy_callback, early_exit)
+    return ref_data, valid_ids, region_ids, time.perf_counter() - started
+
+
+def download_sources(
+    jobs: List[Tuple[str, str]],
+    max_workers: int = 4,
+    timeout: int = 60,
+    conditional: bool = True,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    sinks: Optional[Dict[str, StreamingChannelParser]] = None
+) -> Dict[str, Tuple[bool, float]]:
+    """
+    Download several files concurrently with a bounded thread pool.
+    
+    Args:
+        jobs: List of (url, dest_path) tuples
+        max_workers: Maximum simultaneous downloads
+        timeout: Per-request timeout passed to download_file
+        conditional: Revalidate existing caches with ETag/Last-Modified
+        chunk_size: Bytes per streamed read/write
+        sinks: Optional {dest_path: StreamingChannelParser} to parse while downloading
+    
+    Returns:
+        {dest_path: (success, seconds)} for every job
+    """
+    results = {}
+    if not jobs:
+        return results
+    
+    def _timed_download(url, dest_path):
+        started = time.perf_counter()
+        sink = sinks.get(dest_path) if sinks else None
+        try:
+            ok = download_file(url, dest_path, timeout=timeout, conditional=conditional, chunk_size=chunk_size, sink=sink)
+        finally:
+            if sink is not None:
+                # Close the parser on the thread that fed it
+                sink.finish()
+        return ok, time.perf_counter() - started
+    
+    workers = max(1, min(max_workers, len(jobs)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_timed_download, url, dest): dest for url, dest in jobs}
+        for future in as_completed(futures):
+            dest = futures[future]
+            try:
+                results[dest] = future.result()
+            except Exception as e:
+                print(f"    [FAIL] Download worker error for {os.path.basename(dest)}: {e}")
+                results[dest] = (False, 0.0)
+    
+    return results
+
+
 def fetch_reference_data_smart(
-    reference_sources: List[Tuple[str, str]],
+    reference_sources: List[Union[Dict, Tuple[str, str]]],
     cache_dir: str,
     valid_ids_callback: Optional[Callable] = None,
     force_refresh: bool = False,
-    cache_max_age_hours: float = 24.0
+    cache_max_age_hours: float = 24.0,
+    max_download_workers: int = 4,
+    max_parse_workers: int = 1,
+    download_chunk_size: int = DEFAULT_CHUNK_SIZE,
+    early_exit_scan: bool = True,
+    stream_parse: bool = False,
+    source_report: Optional[Dict[str, Dict]] = None,
+    regional: Optional[Dict] = None,
+    compact_store: bool = False,
+    mapped_index: Optional[str] = None
 ) -> Tuple[Dict[str, str], Set[str]]:
     """
     Fetch and parse EPG reference data with smart caching.
     
+    Stale sources are downloaded concurrently first. Sources without a
+    valid snapshot are then parsed (in worker processes if
+    max_parse_workers > 1), and everything is merged in
+    reference_sources order.
+    
     Args:
-        reference_sources: List of (url, filename) tuples
+        reference_sources: epg_sources registry entries (or legacy (url, filename) tuples),
+            merged in list order; disabled entries are skipped
         cache_dir: Directory to store cached files
         valid_ids_callback: Function to check if ID is invalid/dummy
         force_refresh: If True, re-download all files regardless of cache
-        cache_max_age_hours: Maximum age of cache before refresh (default 24 hours)
+        cache_max_age_hours: Default max cache age for sources without their own ttl_hours
+        max_download_workers: Maximum simultaneous downloads (1 = sequential)
+        max_parse_workers: Maximum parser processes (1 = parse in this process)
+        download_chunk_size: Bytes per streamed download chunk
+        early_exit_scan: Stop scanning channels-first sources at the first <programme>
+        stream_parse: Parse downloads while they stream instead of re-reading them afterwards
+        source_report: If given, filled with {source name: {download_s, parse_s,
+            channels, ids}} for epg_sources.record_source_stats()
+        regional: If given, filled with "maps" ({region: {display_name: xmlid}},
+            same first-source-wins names as the returned reference_data),
+            "ids" ({region: ids}) and "coverage" (validate_epg_coverage() counts),
+            all from regions classified while parsing
+        compact_store: Return reference_data as a reference_store.ReferenceStore and
+            valid_ids as its read-only ID set (regional maps and IDs as views of it)
+            instead of a dict and a set
+        mapped_index: Path of a binary index (implies compact_store). When no
+            source file changed since it was written it is opened with mmap
+            instead of loading snapshots; otherwise it is rewritten after merging
     
     Returns:
-        Tuple of (reference_data dict, valid_ids set)
+        Tuple of (reference_data mapping, valid_ids set)
     """
     os.makedirs(cache_dir, exist_ok=True)
     
     combined_reference_data = {}
     combined_valid_ids = set()
+    combined_maps = {region: {} for region in REGIONS}
+    combined_region_ids = {region: set() for region in REGIONS}
+    store = reference_store.ReferenceStore(REGIONS) if compact_store or mapped_index else None
+    mapped_source_ids = {}
+    
+    # Work out which sources are stale before downloading anything
+    sources = [epg_sources.as_source(entry) for entry in reference_sources]
+    sources = [source for source in sources if source["enabled"]]
     
-    for url, filename in reference_sources:
+    download_jobs = []
+    for source in sources:
+        filename = source["filename"]
         cache_path = os.path.join(cache_dir, filename)
         cache_age = get_cache_age_hours(cache_path)
         
-        # Determine if we need to download
-        needs_download = force_refresh or cache_age > cache_max_age_hours or not os.path.exists(cache_path)
+        # Determine if we need to download (per-source TTL / refresh window)
+        needs_download, reason = epg_sources.needs_refresh(source, cache_age, cache_max_age_hours)
+        if force_refresh:
+            needs_download, reason = True, "forced refresh"
         
         if needs_download:
-            if cache_age != float('inf'):
-                print(f"  [{filename}] Cache age: {cache_age:.1f}h (max: {cache_max_age_hours}h) - refreshing")
-            else:
-                print(f"  [{filename}] No cache found - downloading")
-            
-            success = download_file(url, cache_path)
-            if not success and os.path.exists(cache_path):
-                print(f"    Using stale cache for {filename}")
-            elif not success:
-                print(f"    Skipping {filename} - no data available")
-                continue
+            print(f"  [{filename}] {reason} - downloading")
+            download_jobs.append((source["url"], cache_path))
         else:
-            print(f"  [{filename}] Using cache (age: {cache_age:.1f}h)")
+            print(f"  [{filename}] Using cache ({reason})")
+    
+    callback_fp = callback_fingerprint(valid_ids_callback)
+    source_data = {}
+    origins = {}
+    parse_seconds = {}
+    
+    if download_jobs:
+        sinks = {}
+        known_layouts = {}
+        if stream_parse:
+            for url, cache_path in download_jobs:
+                channels_only, known_layouts[cache_path] = choose_scan_mode(cache_path, early_exit_scan)
+                sinks[cache_path] = StreamingChannelParser(
+                    valid_ids_callback, gzipped=cache_path.endswith('.gz'), channels_only=channels_only
+                )
         
-        # Parse the file
-        print(f"    Parsing {filename}...")
-        ref_data, valid_ids = parse_epg_channels(cache_path, valid_ids_callback)
+        print(f"\n  Downloading {len(download_jobs)} source(s), up to {max_download_workers} at a time...")
+        stage_start = time.perf_counter()
+        download_results = download_sources(
+            download_jobs, max_workers=max_download_workers, conditional=not force_refresh,
+            chunk_size=download_chunk_size, sinks=sinks
+        )
+        stage_seconds = time.perf_counter() - stage_start
+        
+        for url, cache_path in download_jobs:
+            ok, seconds = download_results.get(cache_path, (False, 0.0))
+            print(f"    {os.path.basename(cache_path):<28} {'OK' if ok else 'FAIL':<4} {seconds:6.1f}s")
+        serial_seconds = sum(seconds for _, seconds in download_results.values())
+        print(f"    Download stage: {stage_seconds:.1f}s (sequential would be ~{serial_seconds:.1f}s)\n")
+        
+        # Indexes built during the download only need their snapshot written
+        for cache_path, sink in sinks.items():
+            if not download_results.get(cache_path, (False, 0.0))[0] or sink.result is None:
+                continue
+            ref_data, valid_ids, layout, sha1, region_ids = sink.result
+            save_channel_snapshot(
+                cache_path, callback_fp, ref_data, valid_ids,
+                update_layout(cache_path, known_layouts[cache_path], layout), sha1=sha1, region_ids=region_ids
+            )
+            source_data[cache_path] = (ref_data, valid_ids, region_ids)
+            origins[cache_path] = "stream"
+    else:
+        download_results = {}
+    
+    if mapped_index:
+        index_key = mapped_index_key(sources, cache_dir, callback_fp)
+        mapped = reference_store.open_mapped(mapped_index, index_key)
+        if mapped is not None and not source_data:
+            print(f"  [{os.path.basename(mapped_index)}] Index mapped for {len(mapped.source_codes)} source(s)")
+            if source_report is not None:
+                for name in mapped.source_codes:
+                    ids = mapped.source_ids(name)
+                    source_report[name] = {"download_s": 0.0, "parse_s": 0.0, "channels": len(ids), "ids": ids}
+                for source in sources:
+                    if source["name"] in source_report:
+                        cache_path = os.path.join(cache_dir, source["filename"])
+                        source_report[source["name"]]["download_s"] = download_results.get(cache_path, (False, 0.0))[1]
+            return _finish_reference_data(mapped, regional)
+    
+    def merge_source(source: Dict):
+        """Fold one source's index into the combined one (first source wins)"""
+        filename = source["filename"]
+        cache_path = os.path.join(cache_dir, filename)
+        ref_data, valid_ids, region_ids = source_data.pop(cache_path)
+        print(f"  [{filename}] Index from {origins[cache_path]}")
+        
+        id_regions = {xmlid: region for region, ids in region_ids.items() for xmlid in ids}
         
         # Merge results (first source wins for duplicate display names)
         for display_name, xmlid in ref_data.items():
-            if display_name not in combined_reference_data:
+            if store is not None:
+                store.add(display_name, xmlid, id_regions.get(xmlid))
+            elif display_name not in combined_reference_data:
                 combined_reference_data[display_name] = xmlid
+                region = id_regions.get(xmlid)
+                if region:
+                    combined_maps[region][display_name] = xmlid
         
-        combined_valid_ids.update(valid_ids)
+        if store is not None:
+            for xmlid in valid_ids:
+                store.add_id(xmlid, id_regions.get(xmlid))
+            if mapped_index:
+                mapped_source_ids[source["name"]] = valid_ids
+        else:
+            combined_valid_ids.update(valid_ids)
+            for region, ids in region_ids.items():
+                combined_region_ids[region].update(ids)
         
         print(f"    [OK] Found {len(ref_data):,} display names, {len(valid_ids):,} channel IDs")
+        
+        if source_report is not None:
+            source_report[source["name"]] = {
+                "download_s": download_results.get(cache_path, (False, 0.0))[1],
+                "parse_s": parse_seconds.get(cache_path, 0.0),
+                "channels": len(valid_ids),
+                "ids": valid_ids,
+            }
+    
+    # Reuse snapshots where the file is unchanged, parse the rest. Each
+    # source is merged as soon as every earlier one has been, so normally
+    # only one source's index is in memory at a time
+    to_parse = []
+    pending_merge = []
+    for source in sources:
+        filename = source["filename"]
+        cache_path = os.path.join(cache_dir, filename)
+        
+        if cache_path not in source_data:
+            if cache_path in download_results and not download_results[cache_path][0]:
+                if os.path.exists(cache_path):
+                    print(f"  [{filename}] Using stale cache")
+                else:
+                    print(f"  [{filename}] Skipping - no data available")
+                    continue
+            
+            load_start = time.perf_counter()
+            cached = load_channel_snapshot(cache_path, callback_fp)
+            if cached is not None:
+                source_data[cache_path] = cached
+                origins[cache_path] = "snapshot"
+                parse_seconds[cache_path] = time.perf_counter() - load_start
+            else:
+                to_parse.append(cache_path)
+                origins[cache_path] = "parsed"
+        
+        pending_merge.append(source)
+        if not to_parse:
+            merge_source(pending_merge.pop())
+    
+    if to_parse:
+        workers = min(max_parse_workers, len(to_parse))
+        print(f"\n  Parsing {len(to_parse)} source(s) with {workers} worker(s)...")
+        parse_start = time.perf_counter()
+        parsed = parse_sources(
+            to_parse, valid_ids_callback, max_workers=max_parse_workers, early_exit=early_exit_scan
+        )
+        for cache_path, (ref_data, valid_ids, region_ids, seconds) in parsed.items():
+            source_data[cache_path] = (ref_data, valid_ids, region_ids)
+            parse_seconds[cache_path] = seconds
+        print(f"    Parse stage: {time.perf_counter() - parse_start:.1f}s\n")
+    
+    for source in pending_merge:
+        merge_source(source)
+    
+    if store is not None:
+        store.freeze()
+        delta = None
+        if mapped_index:
+            # Diff against the index this one replaces, read into memory so
+            # the file can be replaced
+            previous = reference_store.open_mapped(mapped_index, in_memory=True)
+            if previous is not None and regional is not None:
+                delta = diff_reference_index(previous, store)
+                added = len(delta["all"]["added"])
+                removed = len(delta["all"]["removed_names"])
+                print(f"  Changed since the previous index: +{added:,} / -{removed:,} display names")
+            del previous
+            # Sources parsed this run have their content hashes recorded now
+            index_key = mapped_index_key(sources, cache_dir, callback_fp)
+            try:
+                reference_store.write_mapped(store, mapped_index, index_key, mapped_source_ids)
+            except OSError as e:
+                print(f"    [WARN] Could not save mapped index {mapped_index}: {e}")
+        return _finish_reference_data(store, regional, delta)
     
     print(f"\n  Total: {len(combined_reference_data):,} display names, {len(combined_valid_ids):,} unique channel IDs")
     
+    if regional is not None:
+        regional["maps"] = combined_maps
+        regional["ids"] = combined_region_ids
+        regional["coverage"] = validate_epg_coverage(combined_valid_ids, combined_region_ids)
+    
     return combined_reference_data, combined_valid_ids
 
 
+def _finish_reference_data(
+    store: reference_store.ReferenceStore,
+    regional: Optional[Dict],
+    delta: Optional[Dict] = None
+) -> Tuple[reference_store.ReferenceStore, reference_store.IdSetView]:
+    """fetch_reference_data_smart()'s result (and regional views) for a frozen store"""
+    valid_ids = store.id_set()
+    print(f"\n  Total: {len(store):,} display names, {len(valid_ids):,} unique channel IDs")
+    
+    if regional is not None:
+        region_ids = {region: store.region_ids(region) for region in REGIONS}
+        regional["maps"] = {region: store.region(region) for region in REGIONS}
+        regional["ids"] = region_ids
+        regional["coverage"] = validate_epg_coverage(valid_ids, region_ids)
+        regional["delta"] = delta or {}
+    
+    return store, valid_ids
+
+
+def mapped_index_key(sources: List[Dict], cache_dir: str, callback_fp: str) -> str:
+    """
+    Identify the inputs of a merged index: source order, the contents of
+    each cached file, the dummy-ID filter and the snapshot format.
+    Contents are identified by size and SHA-1 (recorded with each snapshot
+    and carried over on 304s, so revalidation doesn't change the key),
+    falling back to size and mtime until a snapshot has been saved.
+    """
+    inputs = []
+    for source in sources:
+        cache_path = os.path.join(cache_dir, source["filename"])
+        try:
+            stat = os.stat(cache_path)
+            identity = content_identity(cache_path) or [stat.st_size, stat.st_mtime]
+            inputs.append([source["name"], source["filename"]] + identity)
+        except OSError:
+            inputs.append([source["name"], source["filename"], None, None])
+    key = json.dumps([SNAPSHOT_VERSION, callback_fp, inputs])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _diff_sorted(
+    old_table: List[str], old_range: Tuple[int, int],
+    new_table: List[str], new_range: Tuple[int, int]
+) -> Tuple[List[int], List[int], List[Tuple[int, int]]]:
+    """Merge-walk two sorted slices: (old-only positions, new-only positions, (old, new) pairs in both)"""
+    old_only, new_only, common = [], [], []
+    i, old_stop = old_range
+    j, new_stop = new_range
+    while i < old_stop and j < new_stop:
+        old_value, new_value = old_table[i], new_table[j]
+        if old_value == new_value:
+            common.append((i, j))
+            i += 1
+            j += 1
+        elif old_value < new_value:
+            old_only.append(i)
+            i += 1
+        else:
+            new_only.append(j)
+            j += 1
+    old_only.extend(range(i, old_stop))
+    new_only.extend(range(j, new_stop))
+    return old_only, new_only, common
+
+
+def diff_reference_index(
+    previous: reference_store.ReferenceStore,
+    current: reference_store.ReferenceStore
+) -> Dict[Optional[str], Dict]:
+    """
+    What changed between two merged indexes, per region (None = unclassified)
+    and for the whole index ("all"):
+      previous_fingerprint  the old partition's fingerprint (the changes
+                            apply to results recorded against it)
+      added                 {display_name: xmlid} new or re-pointed, in merge order
+      removed_names         display names gone or re-pointed
+      removed_ids           XMLIDs gone
+    A name whose XMLID changed counts as removed and added.
+    """
+    # Additions are listed in pool (merge) order
+    def rank(code):
+        return current.merge_rank(current.names[code])
+    
+    delta = {}
+    whole = {"previous_fingerprint": previous.fingerprint(), "added": [], "removed_names": set(), "removed_ids": set()}
+    for region in current.regions:
+        old_names, new_names, common = _diff_sorted(
+            previous.names, previous.name_ranges.get(region, (0, 0)), current.names, current.name_ranges[region]
+        )
+        for old_code, new_code in common:
+            if previous.ids[previous.name_ids[old_code]] != current.ids[current.name_ids[new_code]]:
+                old_names.append(old_code)
+                new_names.append(new_code)
+        old_ids, _, _ = _diff_sorted(
+            previous.ids, previous.id_ranges.get(region, (0, 0)), current.ids, current.id_ranges[region]
+        )
+        new_names.sort(key=rank)
+        
+        region_delta = {
+            "previous_fingerprint": previous.region_fingerprint(region) if region in previous.name_ranges else None,
+            "added": {current.names[code]: current.ids[current.name_ids[code]] for code in new_names},
+            "removed_names": {previous.names[code] for code in old_names},
+            "removed_ids": {previous.ids[code] for code in old_ids},
+        }
+        delta[region] = region_delta
+        whole["added"].extend(new_names)
+        whole["removed_names"] |= region_delta["removed_names"]
+        whole["removed_ids"] |= region_delta["removed_ids"]
+    
+    # A name or ID can move between regions - only what left the whole index is removed from it
+    whole["added"].sort(key=rank)
+    whole["added"] = {current.names[code]: current.ids[current.name_ids[code]] for code in whole["added"]}
+    whole["removed_names"] = {name for name in whole["removed_names"] if current.get(name) is None}
+    whole["removed_ids"] = {xmlid for xmlid in whole["removed_ids"] if xmlid not in current.id_set()}
+    delta["all"] = whole
+    return delta
+
+
 def build_reverse_lookup(reference_data: Dict[str, str]) -> Dict[str, List[str]]:
     """
     Build a reverse lookup: {xmlid: [display_names]}
@@ -208,31 +1492,66 @@ def extract_callsign_from_epg_id(xmlid: str) -> Optional[str]:
     return None
 
 
-def get_xmlids_by_callsign(valid_ids: Set[str], callsign: str) -> List[str]:
-    """
-    Find all XMLIDs that contain a specific callsign.
+_ID_TOKEN_SPLIT = re.compile(r'[^A-Z0-9]+')
+
+
+def _id_tokens(xmlid: str) -> Set[str]:
+    """Alphanumeric runs of the upper-cased ID, plus hyphen-joined runs ("WABC-DT" -> WABCDT)"""
+    upper = xmlid.upper()
+    tokens = set(_ID_TOKEN_SPLIT.split(upper))
+    tokens.update(part.replace('-', '') for part in re.findall(r'[A-Z0-9]+(?:-[A-Z0-9]+)+', upper))
+    tokens.discard('')
+    return tokens
+
+
+def build_callsign_index(valid_ids: Set[str]) -> Dict[str, Dict[str, List[str]]]:
     """
-    import re
-    
-    callsign_upper = callsign.upper()
-    matches = []
+    Index XMLIDs by callsign, built once per reference load.
     
+    Returns:
+        {"callsign": {CALLSIGN: [xmlids]}, "token": {TOKEN: [xmlids]}}
+        "callsign" holds extract_callsign_from_epg_id() results, "token"
+        every alphanumeric run of the upper-cased ID (plus hyphen-joined
+        runs, so "WABC-DT" is found as WABCDT too)
+    """
+    by_callsign = {}
+    by_token = {}
     for xmlid in valid_ids:
-        # Check if callsign appears in the XMLID
-        if callsign_upper in xmlid.upper():
-            matches.append(xmlid)
-        # Also check for patterns like "(WABC)" in the ID
-        if f"({callsign_upper})" in xmlid.upper():
-            matches.append(xmlid)
+        callsign = extract_callsign_from_epg_id(xmlid)
+        if callsign:
+            by_callsign.setdefault(callsign, []).append(xmlid)
+        
+        for token in _id_tokens(xmlid):
+            by_token.setdefault(token, []).append(xmlid)
     
-    return list(set(matches))
+    for postings in (by_callsign, by_token):
+        for ids in postings.values():
+            ids.sort()
+    return {"callsign": by_callsign, "token": by_token}
 
 
-def validate_epg_coverage(valid_ids: Set[str]) -> Dict[str, int]:
+def lookup_callsign(index: Dict[str, Dict[str, List[str]]], callsign: str) -> List[str]:
+    """
+    XMLIDs whose callsign or any whole ID token equals callsign
+    (case-insensitive), from a build_callsign_index() index. "WABC" finds
+    WABC.us and ABC.(WABC).New.York,.NY.us but not WABCX.us; "KXAS" and
+    "KXASDT" both find NBC.(KXAS-DT).Dallas.TX.us.
+    """
+    callsign_upper = callsign.upper()
+    hits = set(index["callsign"].get(callsign_upper, ()))
+    hits.update(index["token"].get(callsign_upper, ()))
+    return sorted(hits)
+
+
+def validate_epg_coverage(valid_ids: Set[str], region_ids: Optional[Dict[str, Set[str]]] = None) -> Dict[str, int]:
     """
     Analyze EPG coverage by region/network.
+    Pass region_ids from the parse to skip re-classifying every ID.
     Returns counts of channels by category.
     """
+    if region_ids is None:
+        region_ids = partition_ids(valid_ids)
+    
     stats = {
         'us_total': 0,
         'ca_total': 0,
@@ -243,20 +1562,10 @@ def validate_epg_coverage(valid_ids: Set[str]) -> Dict[str, int]:
         'ca_specialty': 0,
     }
     
-    def _is_region(xid, region):
-        suffix = xid.rsplit('.', 1)[-1] if '.' in xid else ''
-        return suffix.startswith(region)
-
-    for xmlid in valid_ids:
-        if _is_region(xmlid, 'us'):
-            stats['us_total'] += 1
-            if '(' in xmlid and ')' in xmlid:
-                stats['us_locals'] += 1
-            else:
-                stats['us_cable'] += 1
-        elif _is_region(xmlid, 'ca'):
-            stats['ca_total'] += 1
-        elif _is_region(xmlid, 'uk'):
-            stats['uk_total'] += 1
+    stats['us_total'] = len(region_ids['us'])
+    stats['us_locals'] = sum(1 for xmlid in region_ids['us'] if '(' in xmlid and ')' in xmlid)
+    stats['us_cable'] = stats['us_total'] - stats['us_locals']
+    stats['ca_total'] = len(region_ids['ca'])
+    stats['uk_total'] = len(region_ids['uk'])
     
     return stats
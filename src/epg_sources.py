@@ -0,0 +1,360 @@
+"""
+EPG Source Registry - every EPG feed the bridge knows about and its refresh policy
+Used by main.py (reference sources) and recycle_missing.py (broad sources)
+"""
+import os
+import json
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+# Each source:
+#   name            short label used in logs/stats
+#   url, filename   where to fetch it and its name in the cache dir
+#   ttl_hours       max cache age before a refresh (None = global CACHE_MAX_AGE)
+#   priority        merge order, lowest first (first source wins on duplicate names)
+#   enabled         False keeps the entry but never downloads/parses it
+#   refresh_window  (start_hour, end_hour) local time when a due refresh may run,
+#                   or None for any time. Wraps past midnight, e.g. (22, 4).
+#   roles           "reference" = Step 3 matching + Step 6 merge,
+#                   "broad" = recycle_missing lookup database
+#   ttl_factor      TTL multiplier, set by apply_contribution_policy() on demotion
+SOURCES = [
+    {
+        "name": "all_sources",
+        "url": "https://epgshare01.online/epgshare01/epg_ripper_ALL_SOURCES1.xml.gz",
+        "filename": "all_sources.xml.gz",
+        # Huge dump - refresh every other night, overnight only
+        "ttl_hours": 48,
+        "priority": 10,
+        "enabled": True,
+        "refresh_window": (0, 8),
+        "roles": ("reference", "broad"),
+    },
+    {
+        "name": "us_locals",
+        "url": "https://epgshare01.online/epgshare01/epg_ripper_US_LOCALS1.xml.gz",
+        "filename": "us_locals.xml.gz",
+        "ttl_hours": None,
+        "priority": 20,
+        "enabled": True,
+        "refresh_window": None,
+        "roles": ("reference", "broad"),
+    },
+    {
+        "name": "us_sports",
+        "url": "https://epgshare01.online/epgshare01/epg_ripper_US_SPORTS1.xml.gz",
+        "filename": "us_sports.xml.gz",
+        "ttl_hours": None,
+        "priority": 30,
+        "enabled": True,
+        "refresh_window": None,
+        "roles": ("reference",),
+    },
+    # UK sources
+    {
+        "name": "epg_uk_pw",
+        "url": "https://epg.pw/xmltv/epg_GB.xml.gz",
+        "filename": "epg_uk_pw.xml.gz",
+        "ttl_hours": None,
+        "priority": 40,
+        "enabled": True,
+        "refresh_window": None,
+        "roles": ("reference",),
+    },
+    {
+        "name": "epg_uk_ripper",
+        "url": "https://epgshare01.online/epgshare01/epg_ripper_UK1.xml.gz",
+        "filename": "epg_uk_ripper.xml.gz",
+        "ttl_hours": None,
+        "priority": 50,
+        "enabled": True,
+        "refresh_window": None,
+        "roles": ("reference",),
+    },
+    # Canada sources
+    {
+        "name": "epg_canada",
+        "url": "https://epghub.xyz/epg/EPG-CA.xml.gz",
+        "filename": "epg_canada.xml.gz",
+        "ttl_hours": None,
+        "priority": 60,
+        "enabled": True,
+        "refresh_window": None,
+        "roles": ("reference", "broad"),
+    },
+    {
+        "name": "epg_canada_pw",
+        "url": "https://epg.pw/xmltv/epg_CA.xml.gz",
+        "filename": "epg_canada_pw.xml.gz",
+        "ttl_hours": None,
+        "priority": 70,
+        "enabled": True,
+        "refresh_window": None,
+        "roles": ("reference",),
+    },
+    {
+        "name": "globetv_canada1",
+        "url": "https://raw.githubusercontent.com/globetvapp/epg/main/Canada/canada1.xml.gz",
+        "filename": "globetv_canada1.xml.gz",
+        "ttl_hours": None,
+        "priority": 80,
+        "enabled": True,
+        "refresh_window": None,
+        "roles": ("reference",),
+    },
+    {
+        "name": "globetv_canada2",
+        "url": "https://raw.githubusercontent.com/globetvapp/epg/main/Canada/canada2.xml.gz",
+        "filename": "globetv_canada2.xml.gz",
+        "ttl_hours": None,
+        "priority": 90,
+        "enabled": True,
+        "refresh_window": None,
+        "roles": ("reference",),
+    },
+    {
+        "name": "globetv_canada3",
+        "url": "https://raw.githubusercontent.com/globetvapp/epg/main/Canada/canada3.xml.gz",
+        "filename": "globetv_canada3.xml.gz",
+        "ttl_hours": None,
+        "priority": 100,
+        "enabled": True,
+        "refresh_window": None,
+        "roles": ("reference",),
+    },
+    # Broad-only sources
+    {
+        "name": "pluto_us",
+        "url": "https://i.mjh.nz/PlutoTV/us.xml.gz",
+        "filename": "pluto_us.xml.gz",
+        "ttl_hours": 168,
+        "priority": 110,
+        "enabled": True,
+        "refresh_window": None,
+        "roles": ("broad",),
+    },
+]
+
+# Outside its refresh window a source is still refreshed once it is this far past its TTL
+WINDOW_GRACE_HOURS = 24
+
+
+def as_source(entry: Union[Dict, Tuple[str, str]]) -> Dict:
+    """Accept a registry dict or a legacy (url, filename) tuple and return a full source dict"""
+    if isinstance(entry, dict):
+        source = entry
+    else:
+        url, filename = entry
+        source = {"url": url, "filename": filename}
+    return {
+        "name": source.get("name") or source["filename"].split('.')[0],
+        "url": source["url"],
+        "filename": source["filename"],
+        "ttl_hours": source.get("ttl_hours"),
+        "priority": source.get("priority", 0),
+        "enabled": source.get("enabled", True),
+        "refresh_window": source.get("refresh_window"),
+        "roles": tuple(source.get("roles", ("reference",))),
+        "ttl_factor": source.get("ttl_factor", 1),
+    }
+
+
+def get_sources(role: str = "reference", include_disabled: bool = False) -> List[Dict]:
+    """Return the registry sources with a role, in priority order"""
+    sources = [as_source(s) for s in SOURCES]
+    sources = [s for s in sources if role in s["roles"] and (include_disabled or s["enabled"])]
+    return sorted(sources, key=lambda s: s["priority"])
+
+
+def in_refresh_window(window: Optional[Tuple[int, int]], now: Optional[datetime] = None) -> bool:
+    """True if the current local hour is inside window (None = always)"""
+    if not window:
+        return True
+    hour = (now or datetime.now()).hour
+    start, end = window
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def effective_ttl(source: Dict, default_ttl_hours: float) -> float:
+    """The source's own TTL (or the global default if it has none), times its ttl_factor"""
+    ttl = source.get("ttl_hours")
+    ttl = default_ttl_hours if ttl is None else float(ttl)
+    return ttl * source.get("ttl_factor", 1)
+
+
+def needs_refresh(
+    source: Dict,
+    cache_age_hours: float,
+    default_ttl_hours: float,
+    now: Optional[datetime] = None
+) -> Tuple[bool, str]:
+    """
+    Decide whether a cached source should be re-downloaded.
+    
+    Returns:
+        Tuple of (refresh, reason) - reason is a short log string
+    """
+    ttl = effective_ttl(source, default_ttl_hours)
+    if cache_age_hours == float('inf'):
+        return True, "no cache"
+    if cache_age_hours <= ttl:
+        return False, f"age {cache_age_hours:.1f}h, ttl {ttl:g}h"
+    if in_refresh_window(source.get("refresh_window"), now):
+        return True, f"age {cache_age_hours:.1f}h > ttl {ttl:g}h"
+    if cache_age_hours > ttl + WINDOW_GRACE_HOURS:
+        return True, f"age {cache_age_hours:.1f}h, overdue outside refresh window"
+    return False, f"age {cache_age_hours:.1f}h, waiting for refresh window {source['refresh_window']}"
+
+
+# --- Contribution scoring ---
+# A source is judged on its last few runs, once it has at least MIN_SCORED_RUNS
+STATS_HISTORY = 5
+MIN_SCORED_RUNS = 3
+# Skipped sources are re-included this often to re-measure them
+PROBE_DAYS = 14
+# Sources below this share of matched IDs and programmes, but above the
+# cost share, are demoted to a longer TTL
+DEMOTE_CONTRIBUTION_SHARE = 0.01
+DEMOTE_COST_SHARE = 0.25
+DEMOTE_TTL_FACTOR = 3
+
+
+def load_source_stats(stats_path: str) -> Dict:
+    """Per-source run history written by record_source_stats()"""
+    if not os.path.exists(stats_path):
+        return {}
+    try:
+        with open(stats_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return {}
+
+
+def attribute_matched_ids(source_report: Dict[str, Dict], source_order: List[str], matched_ids: Set[str]) -> Dict[str, int]:
+    """
+    Count matched IDs per source. An ID found in several sources is
+    credited to the first one in merge order, like display names are.
+    """
+    counts = {name: 0 for name in source_order}
+    remaining = set(matched_ids)
+    for name in source_order:
+        if name not in source_report or not remaining:
+            continue
+        found = remaining & source_report[name]["ids"]
+        counts[name] = len(found)
+        remaining -= found
+    return counts
+
+
+def record_source_stats(
+    stats_path: str,
+    source_report: Dict[str, Dict],
+    source_order: List[str],
+    matched_ids: Set[str],
+    programme_counts: Dict[str, int]
+) -> Dict:
+    """
+    Append this run's cost and contribution for every source that was
+    loaded: download/parse seconds, channel count, matched IDs it
+    supplied to the output, and programmes it wrote to the EPG.
+    """
+    stats = load_source_stats(stats_path)
+    matched = attribute_matched_ids(source_report, source_order, matched_ids)
+    now = time.time()
+    
+    for name, report in source_report.items():
+        entry = stats.setdefault(name, {"runs": [], "skipped_since": None})
+        entry["runs"].append({
+            "at": now,
+            "download_s": round(report["download_s"], 2),
+            "parse_s": round(report["parse_s"], 2),
+            "channels": report["channels"],
+            "matched_ids": matched.get(name, 0),
+            "programmes": programme_counts.get(name, 0),
+        })
+        entry["runs"] = entry["runs"][-STATS_HISTORY:]
+    
+    os.makedirs(os.path.dirname(stats_path) or '.', exist_ok=True)
+    with open(stats_path, 'w', encoding='utf-8') as f:
+        json.dump(stats, f, indent=2)
+    return stats
+
+
+def _average(runs: List[Dict], key: str) -> float:
+    return sum(run[key] for run in runs) / len(runs) if runs else 0.0
+
+
+def apply_contribution_policy(sources: List[Dict], stats_path: str) -> Tuple[List[Dict], List[str]]:
+    """
+    Drop or demote sources whose cost far exceeds what they contribute.
+    
+    - Skip: over its last MIN_SCORED_RUNS+ runs the source supplied no
+      matched IDs and no programmes. Re-included every PROBE_DAYS days.
+    - Demote: under DEMOTE_CONTRIBUTION_SHARE of matched IDs and
+      programmes while costing over DEMOTE_COST_SHARE of total time;
+      its TTL is multiplied by DEMOTE_TTL_FACTOR.
+    
+    Returns:
+        Tuple of (active sources, report lines)
+    """
+    stats = load_source_stats(stats_path)
+    now = time.time()
+    
+    scored = {}
+    for source in sources:
+        runs = stats.get(source["name"], {}).get("runs", [])
+        if len(runs) >= MIN_SCORED_RUNS:
+            scored[source["name"]] = {
+                "cost": _average(runs, "download_s") + _average(runs, "parse_s"),
+                "matched": _average(runs, "matched_ids"),
+                "programmes": _average(runs, "programmes"),
+                "dead": all(run["matched_ids"] == 0 and run["programmes"] == 0 for run in runs),
+            }
+    
+    total_cost = sum(s["cost"] for s in scored.values()) or 1.0
+    total_matched = sum(s["matched"] for s in scored.values()) or 1.0
+    total_programmes = sum(s["programmes"] for s in scored.values()) or 1.0
+    
+    active = []
+    report = []
+    saved_seconds = 0.0
+    changed = False
+    for source in sources:
+        name = source["name"]
+        score = scored.get(name)
+        entry = stats.get(name, {})
+        
+        if score and score["dead"]:
+            skipped_since = entry.get("skipped_since") or now
+            if now - skipped_since < PROBE_DAYS * 86400:
+                if not entry.get("skipped_since"):
+                    entry["skipped_since"] = now
+                    changed = True
+                saved_seconds += score["cost"]
+                report.append(f"{name}: skipped (no matches or programmes in {len(entry['runs'])} runs, ~{score['cost']:.1f}s/run)")
+                continue
+            # Probe run - measure it again
+            entry["skipped_since"] = None
+            changed = True
+            report.append(f"{name}: re-probing after {PROBE_DAYS} days skipped")
+        
+        if (score and not score["dead"]
+                and score["matched"] / total_matched < DEMOTE_CONTRIBUTION_SHARE
+                and score["programmes"] / total_programmes < DEMOTE_CONTRIBUTION_SHARE
+                and score["cost"] / total_cost > DEMOTE_COST_SHARE):
+            source = dict(source, ttl_factor=DEMOTE_TTL_FACTOR)
+            saved_seconds += score["cost"] * (1 - 1 / DEMOTE_TTL_FACTOR)
+            report.append(f"{name}: demoted to {DEMOTE_TTL_FACTOR}x TTL (~{score['matched']:.0f} matched IDs for ~{score['cost']:.1f}s/run)")
+        
+        active.append(source)
+    
+    if changed:
+        with open(stats_path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=2)
+    
+    if report:
+        report.append(f"Estimated time saved: ~{saved_seconds:.1f}s per run")
+    return active, report
@@ -0,0 +1,192 @@
+"""
+Fuzzy Engine - WRatio scoring against a pre-processed search pool
+Uses rapidfuzz when installed, otherwise fuzzywuzzy (the original scorer)
+
+Scores are integers 0-100 like fuzzywuzzy's, and ties keep pool order.
+rapidfuzz's WRatio finds the optimal partial_ratio alignment where
+fuzzywuzzy's python-Levenshtein path approximates it. For pairs scoring
+80+ the rapidfuzz score is at most 1 point lower and up to SCORE_TOLERANCE
+points higher than fuzzywuzzy's, so a few names near the Phase 1 cutoff
+of 93 can be accepted by one backend and not the other. Lower scores can
+differ more, which only reorders the tail of Strategy 3's candidate list.
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+except ImportError:
+    rf_fuzz = rf_process = None
+
+try:
+    from fuzzywuzzy import process as fw_process
+except ImportError:
+    fw_process = None
+
+SCORE_TOLERANCE = 8
+
+# Below this many queries, worker start-up costs more than it saves
+PARALLEL_MIN_QUERIES = 200
+
+_NON_WORD = re.compile(r'(?ui)\W')
+# fuzzywuzzy's force_ascii only drops U+0080-U+00FF; superscript markers
+# like "ᴬᵂ" are kept
+_LATIN1_TABLE = dict.fromkeys(range(128, 256))
+
+
+def preprocess(text: str) -> str:
+    """fuzzywuzzy's full_process(force_ascii=True): drop U+0080-U+00FF, non-word chars to spaces, lower, strip"""
+    text = text.translate(_LATIN1_TABLE)
+    return _NON_WORD.sub(' ', text).lower().strip()
+
+
+def default_backend() -> str:
+    """FUZZY_ENGINE from the environment, else rapidfuzz if installed"""
+    backend = os.getenv("FUZZY_ENGINE", "").lower()
+    if backend in ("rapidfuzz", "fuzzywuzzy"):
+        return backend
+    return "rapidfuzz" if rf_process is not None else "fuzzywuzzy"
+
+
+class FuzzyPool:
+    """
+    A search pool (list of display names) prepared once for repeated
+    WRatio queries.
+    """
+
+    def __init__(self, names: List[str], backend: Optional[str] = None):
+        self.names = names
+        self.backend = backend or default_backend()
+        if self.backend == "rapidfuzz" and rf_process is None:
+            self.backend = "fuzzywuzzy"
+        self.processed = [preprocess(name) for name in names] if self.backend == "rapidfuzz" else None
+
+    def _scored(self, query: str, score_cutoff: float) -> List[Tuple[int, int]]:
+        """(rounded score, pool position) for every name scoring >= score_cutoff, best first"""
+        hits = rf_process.extract(
+            query, self.processed, scorer=rf_fuzz.WRatio, processor=None,
+            limit=None, score_cutoff=max(score_cutoff - 0.5, 0)
+        )
+        scored = [(int(round(score)), pos) for _, score, pos in hits]
+        scored = [(score, pos) for score, pos in scored if score >= score_cutoff]
+        scored.sort(key=lambda hit: (-hit[0], hit[1]))
+        return scored
+
+    def best(self, query: str, score_cutoff: int = 0) -> Optional[Tuple[str, int]]:
+        """Best (name, score) with score >= score_cutoff, or None"""
+        if self.backend == "fuzzywuzzy":
+            matches = fw_process.extract(query, self.names, limit=1)
+            if matches and matches[0][1] >= score_cutoff:
+                return matches[0]
+            return None
+
+        processed_query = preprocess(query)
+        if not processed_query or not self.names:
+            return (self.names[0], 0) if self.names and score_cutoff <= 0 else None
+        scored = self._scored(processed_query, score_cutoff)
+        if not scored:
+            return None
+        score, pos = scored[0]
+        return self.names[pos], score
+
+    def best_many(self, queries: List[str], score_cutoff: int = 0) -> List[Optional[Tuple[str, int]]]:
+        """best() for each query; repeated queries are only scored once"""
+        results: Dict[str, Optional[Tuple[str, int]]] = {}
+        for query in queries:
+            if query not in results:
+                results[query] = self.best(query, score_cutoff)
+        return [results[query] for query in queries]
+
+    def top(self, query: str, limit: int) -> List[Tuple[str, int]]:
+        """The limit best (name, score) pairs, like fuzzywuzzy's process.extract"""
+        if self.backend == "fuzzywuzzy":
+            return fw_process.extract(query, self.names, limit=limit)
+
+        processed_query = preprocess(query)
+        if limit <= 0 or not self.names:
+            return []
+        if not processed_query:
+            return [(name, 0) for name in self.names[:limit]]
+
+        # Find the limit-th best raw score, then collect everything that
+        # rounds to at least that so ties are resolved in pool order
+        head = rf_process.extract(processed_query, self.processed, scorer=rf_fuzz.WRatio, processor=None, limit=limit)
+        floor = int(round(head[-1][1])) if head else 0
+        scored = self._scored(processed_query, floor)
+        return [(self.names[pos], score) for score, pos in scored[:limit]]
+
+
+# Per-worker state for best_many_parallel(): pool names arrive once, with
+# the initializer, and each pool is prepared on its first query
+_worker_names: Dict[str, List[str]] = {}
+_worker_backend: Optional[str] = None
+_worker_pools: Dict[str, FuzzyPool] = {}
+
+
+def _init_worker(pool_names: Dict[str, List[str]], backend: str):
+    global _worker_names, _worker_backend
+    _worker_names = pool_names
+    _worker_backend = backend
+    _worker_pools.clear()
+
+
+def _best_chunk(key: str, queries: List[str], score_cutoff: int) -> List[Optional[Tuple[str, int]]]:
+    pool = _worker_pools.get(key)
+    if pool is None:
+        pool = _worker_pools[key] = FuzzyPool(_worker_names[key], _worker_backend)
+    return [pool.best(query, score_cutoff) for query in queries]
+
+
+def best_many_parallel(
+    pool_names: Dict[str, List[str]],
+    queries: Dict[str, List[str]],
+    score_cutoff: int = 0,
+    max_workers: int = 1,
+    backend: Optional[str] = None
+) -> Dict[str, List[Optional[Tuple[str, int]]]]:
+    """
+    FuzzyPool.best_many() for several pools at once, with the queries
+    sharded across worker processes.
+
+    Each worker receives every pool's names once, at start-up, and
+    prepares its own FuzzyPools; tasks only carry (pool key, query chunk).
+    Results come back in query order and match the serial ones exactly.
+    Falls back to scoring in this process if the workers can't be started.
+
+    Args:
+        pool_names: {pool key: search pool names, in pool order}
+        queries: {pool key: queries against that pool}
+        score_cutoff: Minimum score for a result (else None)
+        max_workers: Worker processes to use
+        backend: "rapidfuzz" or "fuzzywuzzy" (default_backend() if None)
+
+    Returns:
+        {pool key: [best (name, score) or None per query]}
+    """
+    backend = backend or default_backend()
+    unique = {key: list(dict.fromkeys(key_queries)) for key, key_queries in queries.items()}
+    total = sum(len(key_queries) for key_queries in unique.values())
+    chunk_size = max(1, -(-total // (max_workers * 4)))
+    chunks = [
+        (key, key_queries[start:start + chunk_size])
+        for key, key_queries in unique.items()
+        for start in range(0, len(key_queries), chunk_size)
+    ]
+
+    best: Dict[str, Dict[str, Optional[Tuple[str, int]]]] = {key: {} for key in unique}
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker, initargs=(pool_names, backend)
+        ) as executor:
+            futures = [executor.submit(_best_chunk, key, chunk, score_cutoff) for key, chunk in chunks]
+            for (key, chunk), future in zip(chunks, futures):
+                best[key].update(zip(chunk, future.result()))
+    except Exception as e:
+        print(f"    [WARN] Parallel fuzzy matching failed ({e}) - matching serially")
+        for key, key_queries in unique.items():
+            pool = FuzzyPool(pool_names[key], backend)
+            best[key] = dict(zip(key_queries, pool.best_many(key_queries, score_cutoff)))
+
+    return {key: [best[key][query] for query in key_queries] for key, key_queries in queries.items()}
@@ -3,6 +3,7 @@ import os
 import time
 import google.generativeai as genai
 from dotenv import load_dotenv
+import reference_store
 
 # --- CONFIGURATION (DYNAMIC PATHS) ---
 load_dotenv()
@@ -17,6 +18,8 @@ PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
 INPUT_FILE = os.path.join(PROJECT_ROOT, "logs", "high_priority_hunt.txt")
 OUTPUT_FILE = os.path.join(PROJECT_ROOT, "suggested_matches.json")
 KNOWN_MATCHES = os.path.join(PROJECT_ROOT, "data", "known_matches.json")
+# Merged reference index written by main.py (memory-mapped, read-only)
+REFERENCE_INDEX = os.path.join(PROJECT_ROOT, "data", "cache", "reference_index.bin")
 
 BATCH_SIZE = 20
 
@@ -130,6 +133,10 @@ def main():
         print("Nothing new to hunt! Great job.")
         return
 
+    # Flag suggested IDs the reference EPG doesn't carry (main.py drops those as stale)
+    reference = reference_store.open_mapped(REFERENCE_INDEX)
+    valid_ids = reference.id_set() if reference is not None else None
+
     # Process in batches
     for i in range(0, len(work_list), BATCH_SIZE):
         batch = work_list[i : i + BATCH_SIZE]
@@ -143,7 +150,8 @@ def main():
             
             print(f"  + Found {len(new_matches)} matches:")
             for channel, xmlid in new_matches.items():
-                print(f"    - {channel}  ->  {xmlid}") 
+                note = "  (not in reference EPG)" if valid_ids is not None and xmlid not in valid_ids else ""
+                print(f"    - {channel}  ->  {xmlid}{note}") 
 
         else:
             print("  - No matches found in this batch.")
@@ -7,11 +7,17 @@ import gzip
 import re
 from copy import deepcopy
 from lxml import etree
-from fuzzywuzzy import process
 from tqdm import tqdm
 from dotenv import load_dotenv
 import ai_client
 import epg_cache
+import epg_sources
+import name_index
+import fuzzy_engine
+import channel_database
+import reference_store
+import match_memo
+import alias_table
 import console_ui as ui
 
 load_dotenv()
@@ -30,6 +36,11 @@ SUGGESTED_MATCHES_FILE = os.path.join(PROJECT_ROOT, "suggested_matches.json")
 MISSING_LOG = os.path.join(PROJECT_ROOT, "logs", "missing_channels.txt")
 CACHE_DIR = os.path.join(PROJECT_ROOT, "data", "cache")
 PLAYLIST_CACHE = os.path.join(PROJECT_ROOT, "data", "playlist_cache.json")
+SOURCE_STATS_FILE = os.path.join(CACHE_DIR, "source_stats.json")
+REFERENCE_INDEX_FILE = os.path.join(CACHE_DIR, "reference_index.bin")
+MATCH_MEMO_FILE = os.path.join(CACHE_DIR, "match_memo.json")
+NEGATIVE_CACHE_FILE = os.path.join(CACHE_DIR, "negative_cache.json")
+LEARNED_ALIASES_FILE = os.path.join(PROJECT_ROOT, "data", "learned_aliases.json")
 
 PRIORITY_PREFIXES = [
     "US| ", "CA| ", "UK| ",
@@ -39,6 +50,9 @@ PRIORITY_PREFIXES = [
     "4K| ", "ENGLISH| ", "EN| ",
 ]
 OFFLINE_MODE = os.getenv("OFFLINE_MODE", "true").lower() in ("true", "1", "yes")
+SOURCE_AUTO_SKIP = os.getenv("SOURCE_AUTO_SKIP", "true").lower() in ("true", "1", "yes")
+NEGATIVE_RETRY_DAYS = float(os.getenv("NEGATIVE_RETRY_DAYS", "14"))
+ALIAS_MIN_VOTES = int(os.getenv("ALIAS_MIN_VOTES", "2"))
 
 # --- CONFIG ---
 SKIP_KNOWN_MISSING = False  # TEMPORARILY DISABLED to give AI a chance
@@ -47,20 +61,8 @@ MAX_AI_CALLS = None  # UNLIMITED - Process all channels with AI
 TOTAL_STEPS = 7
 
 # --- SOURCES ---
-REFERENCE_SOURCES = [
-    ("https://epgshare01.online/epgshare01/epg_ripper_ALL_SOURCES1.xml.gz", "all_sources.xml.gz"),
-    ("https://epgshare01.online/epgshare01/epg_ripper_US_LOCALS1.xml.gz", "us_locals.xml.gz"),
-    ("https://epgshare01.online/epgshare01/epg_ripper_US_SPORTS1.xml.gz", "us_sports.xml.gz"),
-    # UK sources
-    ("https://epg.pw/xmltv/epg_GB.xml.gz", "epg_uk_pw.xml.gz"),
-    ("https://epgshare01.online/epgshare01/epg_ripper_UK1.xml.gz", "epg_uk_ripper.xml.gz"),
-    # Canada sources
-    ("https://epghub.xyz/epg/EPG-CA.xml.gz", "epg_canada.xml.gz"),
-    ("https://epg.pw/xmltv/epg_CA.xml.gz", "epg_canada_pw.xml.gz"),
-    ("https://raw.githubusercontent.com/globetvapp/epg/main/Canada/canada1.xml.gz", "globetv_canada1.xml.gz"),
-    ("https://raw.githubusercontent.com/globetvapp/epg/main/Canada/canada2.xml.gz", "globetv_canada2.xml.gz"),
-    ("https://raw.githubusercontent.com/globetvapp/epg/main/Canada/canada3.xml.gz", "globetv_canada3.xml.gz"),
-]
+# Defined (with per-source TTL, priority and refresh window) in epg_sources.py
+REFERENCE_SOURCES = epg_sources.get_sources("reference")
 
 def fetch_playlist():
     """Fetch live streams from Xtream Codes API with retry."""
@@ -142,16 +144,11 @@ def extract_core_name(channel_name):
     # Fallback
     return channel_name.strip()
 
-def is_region(xml_id, region):
-    """Check if an XML ID belongs to a region.
-    Handles compound suffixes like .us_locals1, .us2, .ca2, etc."""
-    # Get everything after the last dot
-    suffix = xml_id.rsplit('.', 1)[-1] if '.' in xml_id else ''
-    return suffix.startswith(region)
-
-def find_candidates(channel_name, search_pool, pool_map, max_candidates=40):
+def find_candidates(channel_name, search_pool, pool_map, max_candidates=40, pool_index=None, fuzzy_pool=None):
     """
     Find EPG candidates using multiple strategies, not just fuzzy.
+    pool_index (name_index.NameIndex) and fuzzy_pool (fuzzy_engine.FuzzyPool)
+    are optional prepared indexes over search_pool.
     Returns dict of {display_name: xml_id}.
     """
     candidate_dict = {}
@@ -167,11 +164,15 @@ def find_candidates(channel_name, search_pool, pool_map, max_candidates=40):
         term_lower = term.lower()
         if len(term_lower) < 2:
             continue
-        for epg_name in search_pool:
-            if term_lower in epg_name.lower() or epg_name.lower() in term_lower:
-                candidate_dict[epg_name] = pool_map[epg_name]
-                if len(candidate_dict) >= max_candidates:
-                    break
+        if pool_index is not None:
+            matched_pool = [search_pool[pos] for pos in pool_index.substring_matches(term_lower)]
+        else:
+            matched_pool = (epg_name for epg_name in search_pool
+                            if term_lower in epg_name.lower() or epg_name.lower() in term_lower)
+        for epg_name in matched_pool:
+            candidate_dict[epg_name] = pool_map[epg_name]
+            if len(candidate_dict) >= max_candidates:
+                break
         if len(candidate_dict) >= max_candidates:
             break
 
@@ -181,19 +182,24 @@ def find_candidates(channel_name, search_pool, pool_map, max_candidates=40):
             words = [w.lower() for w in term.split() if len(w) > 1]
             if not words:
                 continue
-            for epg_name in search_pool:
-                epg_lower = epg_name.lower()
-                if all(w in epg_lower for w in words):
-                    if epg_name not in candidate_dict:
-                        candidate_dict[epg_name] = pool_map[epg_name]
-                        if len(candidate_dict) >= max_candidates:
-                            break
+            if pool_index is not None:
+                matched_pool = [search_pool[pos] for pos in pool_index.all_words_matches(words)]
+            else:
+                matched_pool = (epg_name for epg_name in search_pool
+                                if all(w in epg_name.lower() for w in words))
+            for epg_name in matched_pool:
+                if epg_name not in candidate_dict:
+                    candidate_dict[epg_name] = pool_map[epg_name]
+                    if len(candidate_dict) >= max_candidates:
+                        break
 
     # Strategy 3: Fuzzy as fallback (fills remaining slots)
     remaining = max_candidates - len(candidate_dict)
     if remaining > 0:
         for term in search_terms:
-            fuzzy_results = process.extract(term, search_pool, limit=remaining)
+            if fuzzy_pool is None:
+                fuzzy_pool = fuzzy_engine.FuzzyPool(search_pool)
+            fuzzy_results = fuzzy_pool.top(term, remaining)
             for match, score in fuzzy_results:
                 if match not in candidate_dict:
                     candidate_dict[match] = pool_map[match]
@@ -201,23 +207,86 @@ def find_candidates(channel_name, search_pool, pool_map, max_candidates=40):
     return candidate_dict
 
 
-def build_regional_maps(reference_map):
-    """Pre-compute regional subsets once instead of filtering per channel."""
-    us_map = {name: xml_id for name, xml_id in reference_map.items() if is_region(xml_id, 'us')}
-    ca_map = {name: xml_id for name, xml_id in reference_map.items() if is_region(xml_id, 'ca')}
-    uk_map = {name: xml_id for name, xml_id in reference_map.items() if is_region(xml_id, 'uk')}
-    return {"US": us_map, "CA": ca_map, "UK": uk_map}
+def get_region_key(channel_name, regional_maps):
+    """Key of the regional map a channel searches ("US", "CA", "UK"), or "ALL"."""
+    if channel_name.startswith("CA| "):
+        region = "CA"
+    elif channel_name.startswith("US| ") or channel_name.startswith("SLING| "):
+        region = "US"
+    elif channel_name.startswith(("UK| ", "UK-BBCI| ", "UK-NOWTV| ")):
+        region = "UK"
+    else:
+        # PRIME|, GO|, PLAY+|, SPORTS|, 4K|, etc. -> search all regions
+        return "ALL"
+    return region if regional_maps[region] else "ALL"
 
 def get_regional_map(channel_name, regional_maps, reference_map):
     """Get the appropriate regional map for a channel name."""
-    if channel_name.startswith("CA| "):
-        return regional_maps["CA"] or reference_map
-    if channel_name.startswith("US| ") or channel_name.startswith("SLING| "):
-        return regional_maps["US"] or reference_map
-    if channel_name.startswith(("UK| ", "UK-BBCI| ", "UK-NOWTV| ")):
-        return regional_maps["UK"] or reference_map
-    # PRIME|, GO|, PLAY+|, SPORTS|, 4K|, etc. -> search all regions
-    return reference_map
+    region = get_region_key(channel_name, regional_maps)
+    return reference_map if region == "ALL" else regional_maps[region]
+
+def get_key_index(region, key_indexes, pool_map):
+    """Canonical-key index over a region's search pool, built the first time it's needed."""
+    if region not in key_indexes:
+        key_indexes[region] = channel_database.build_key_index(pool_map)
+    return key_indexes[region]
+
+def get_changed_keys(scope, changed_keys, changes):
+    """Canonical keys of the names added or removed in a scope since the last run, built the first time they're needed."""
+    if scope not in changed_keys:
+        changed_names = list(changes["added"]) + list(changes["removed_names"])
+        changed_keys[scope] = {channel_database.canonical_key(name) for name in changed_names}
+    return changed_keys[scope]
+
+def get_fuzzy_pool(region, fuzzy_pools, pool_map):
+    """FuzzyPool over a region's search pool, built the first time it's needed."""
+    if region not in fuzzy_pools:
+        fuzzy_pools[region] = fuzzy_engine.FuzzyPool(list(pool_map.keys()))
+    return fuzzy_pools[region]
+
+def get_pool_index(region, pool_indexes, pool_map):
+    """NameIndex over a region's search pool, built the first time it's needed."""
+    if region not in pool_indexes:
+        pool_indexes[region] = name_index.NameIndex(list(pool_map.keys()))
+    return pool_indexes[region]
+
+def strip_playlist_prefix(channel_name):
+    """Name without its PRIORITY_PREFIXES prefix ("SLING| CNN" -> "CNN")."""
+    for prefix in PRIORITY_PREFIXES:
+        if channel_name.startswith(prefix):
+            return channel_name[len(prefix):]
+    return channel_name
+
+def channel_identity(channel_name, regional_maps):
+    """
+    Region plus the canonical key of the name without its playlist prefix,
+    shared by variants of one channel ("US| CNN HD", "US| CNN", "SLING| CNN"
+    -> "US|CNN"). None if the name normalizes to nothing.
+    """
+    key = channel_database.canonical_key(extract_core_name(strip_playlist_prefix(channel_name)))
+    return f"{get_region_key(channel_name, regional_maps)}|{key}" if key else None
+
+def group_equivalent_names(names, regional_maps):
+    """
+    Group playlist variants of one channel by channel_identity().
+    Returns {representative: [other members]} in playlist order. The
+    representative is the first member whose core name doesn't depend on
+    its playlist prefix, so e.g. "SLING| CNN" (core "SLING") never stands
+    in for "US| CNN".
+    """
+    groups = {}
+    for name in dict.fromkeys(names):
+        identity = channel_identity(name, regional_maps)
+        groups.setdefault(identity or (None, name), []).append(name)
+
+    def keeps_core(name):
+        return extract_core_name(name) == extract_core_name(strip_playlist_prefix(name))
+
+    representatives = {}
+    for members in groups.values():
+        representative = next((m for m in members if keeps_core(m)), members[0])
+        representatives[representative] = [m for m in members if m != representative]
+    return representatives
 
 def is_priority_channel(name):
     """Check if channel belongs to a priority region (US, CA, UK) without substring false matches."""
@@ -313,19 +382,63 @@ def main():
     ui.step(3, TOTAL_STEPS, "Loading reference EPG data...")
 
     cache_max_age = float(os.getenv("CACHE_MAX_AGE", "24"))
+    download_workers = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+    parse_workers = int(os.getenv("PARSE_WORKERS", "0")) or epg_cache.default_parse_workers()
+    chunk_kb = int(os.getenv("DOWNLOAD_CHUNK_KB", "1024"))
+    stream_parse = os.getenv("STREAM_PARSE", "true").lower() in ("true", "1", "yes")
+    phase1_workers = int(os.getenv("PHASE1_WORKERS", "0")) or epg_cache.default_parse_workers()
+
+    active_sources = REFERENCE_SOURCES
+    if SOURCE_AUTO_SKIP:
+        active_sources, policy_report = epg_sources.apply_contribution_policy(REFERENCE_SOURCES, SOURCE_STATS_FILE)
+        for line in policy_report:
+            ui.info(line)
+
+    source_report = {}
+    regional = {}
     reference_data, valid_ids = epg_cache.fetch_reference_data_smart(
-        REFERENCE_SOURCES, CACHE_DIR, cache_max_age_hours=cache_max_age
+        active_sources, CACHE_DIR, cache_max_age_hours=cache_max_age,
+        max_download_workers=download_workers, max_parse_workers=parse_workers,
+        download_chunk_size=chunk_kb * 1024, stream_parse=stream_parse,
+        source_report=source_report, regional=regional, compact_store=True,
+        mapped_index=REFERENCE_INDEX_FILE
     )
-    id_to_name = {xml_id: names[0] for xml_id, names in epg_cache.build_reverse_lookup(reference_data).items() if names}
-    ref_names = list(reference_data.keys())
 
-    ca_count = sum(1 for xml_id in valid_ids if is_region(xml_id, 'ca'))
-    us_count = sum(1 for xml_id in valid_ids if is_region(xml_id, 'us'))
-    uk_count = sum(1 for xml_id in valid_ids if is_region(xml_id, 'uk'))
+    coverage = regional["coverage"]
     ui.success(f"{len(reference_data):,} display names | {len(valid_ids):,} channel IDs")
-    ui.info(f"US: {us_count:,} | CA: {ca_count:,} | UK: {uk_count:,}")
-
-    regional_maps = build_regional_maps(reference_data)
+    ui.info(f"US: {coverage['us_total']:,} | CA: {coverage['ca_total']:,} | UK: {coverage['uk_total']:,}")
+    peak_rss = reference_store.peak_rss_mb()
+    if peak_rss:
+        ui.info(f"Peak RSS after loading: {peak_rss:,.0f} MB")
+
+    # Regional subsets were partitioned while parsing - no rescan here.
+    # Name-based structures (key indexes, callsign index, fuzzy pools, name
+    # indexes) are built on first use, so a run where every channel is
+    # already known only touches valid_ids
+    regional_maps = {region.upper(): name_map for region, name_map in regional["maps"].items()}
+    callsign_index = None
+
+    # Phase 1 outcomes from earlier runs, reused while the channel's
+    # reference partition is unchanged
+    fingerprints = {region.upper(): reference_data.region_fingerprint(region) for region in epg_cache.REGIONS}
+    fingerprints["ALL"] = reference_data.fingerprint()
+    memo_backend = fuzzy_engine.default_backend()
+    memo = match_memo.load_memo(MATCH_MEMO_FILE, memo_backend)
+    memo_hits = 0
+
+    # Names added/removed since the previous run's index, by memo scope, so
+    # outcomes recorded against the previous partition can be carried over
+    delta = regional["delta"]
+    delta_by_scope = {region.upper(): delta[region] for region in epg_cache.REGIONS if region in delta}
+    if delta:
+        delta_by_scope["ALL"] = delta["all"]
+    delta_queue = {}
+    changed_keys = {}
+    revalidated = 0
+
+    # XMLIDs learned from confirmed matches, by channel identity
+    aliases = alias_table.load_aliases(LEARNED_ALIASES_FILE)
+    alias_hits = 0
     target_names = [name for name in all_channel_names if is_priority_channel(name)]
     ui.info(f"{len(target_names):,} priority channels to process")
 
@@ -339,49 +452,206 @@ def main():
 
     pbar = tqdm(target_names, unit="ch", bar_format="    {l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]")
 
+    # Pass 1: cheap tiers per channel; the rest is queued per region for fuzzy
+    tiers = {}
+    pending = {}
+    fuzzy_queue = {}
+    fuzzy_scopes = {}
+    key_indexes = {}
     for name in pbar:
         if name in known_matches:
             target_id = known_matches[name]
             if target_id in valid_ids:
-                final_matches[name] = target_id
-                stats["known"] += 1
+                tiers[name] = ("known", target_id)
                 continue
             else:
                 stats["stale"] += 1
                 del known_matches[name]
 
         if SKIP_KNOWN_MISSING and name in known_missing:
-            new_missing.append(name)
-            stats["skipped"] += 1
+            tiers[name] = ("skipped", None)
             continue
 
-        core_name = extract_core_name(name)
+        memo_entry = match_memo.lookup(memo, name, fingerprints)
+        core_name = memo_entry["core"] if memo_entry else extract_core_name(name)
 
         if core_name in reference_data:
-            final_matches[name] = reference_data[core_name]
-            known_matches[name] = reference_data[core_name]
-            stats["exact"] += 1
+            tiers[name] = ("exact", reference_data[core_name])
             continue
 
-        filtered_map = get_regional_map(name, regional_maps, reference_data)
-        filtered_names = list(filtered_map.keys())
+        # Another variant of this channel was confirmed before
+        alias_id = alias_table.resolve(aliases, channel_identity(name, regional_maps), valid_ids, ALIAS_MIN_VOTES)
+        if alias_id:
+            tiers[name] = ("exact", alias_id)
+            alias_table.mark_derived(aliases, name)
+            alias_hits += 1
+            continue
 
-        search_pool = filtered_names if filtered_names else ref_names
-        matches = process.extract(core_name, search_pool, limit=1)
+        if memo_entry:
+            memo_hits += 1
+            tiers[name] = ("miss", None) if memo_entry["tier"] == "miss" else ("exact", memo_entry["id"])
+            continue
 
-        if matches and matches[0][1] >= 93:
-            best_id = (filtered_map if filtered_names else reference_data)[matches[0][0]]
-            final_matches[name] = best_id
-            known_matches[name] = best_id
-            stats["exact"] += 1
+        # Reference data changed since the last run: a former miss or fuzzy
+        # match only has to be compared with the names added since, as long
+        # as its match wasn't removed. Channels whose canonical key an added
+        # or removed name shares (the key may have become ambiguous or
+        # unique), and callsign channels (that tier looks at every ID), are
+        # rescanned in full
+        stale_entry = memo.get(name)
+        changes = delta_by_scope.get(stale_entry["scope"]) if stale_entry else None
+        if (changes and stale_entry["fp"] == changes["previous_fingerprint"]
+                and f"({core_name})" not in name
+                and stale_entry["scope"] == get_region_key(name, regional_maps)
+                and stale_entry.get("id") not in changes["removed_ids"]
+                and stale_entry.get("match") not in changes["removed_names"]
+                and channel_database.canonical_key(core_name)
+                not in get_changed_keys(stale_entry["scope"], changed_keys, changes)):
+            if stale_entry["tier"] in ("miss", "fuzzy"):
+                delta_queue.setdefault(stale_entry["scope"], {})[name] = (core_name, stale_entry)
+            else:
+                tiers[name] = ("exact", stale_entry["id"])
+                match_memo.record(memo, name, stale_entry["scope"], fingerprints, core_name,
+                                  stale_entry["tier"], stale_entry["id"])
+                revalidated += 1
+            continue
+
+        pending[name] = core_name
+
+    # Fuzzy pool over the added names only (their keys can't match - see
+    # above); an earlier fuzzy match stands unless an added name beats it,
+    # or ties it earlier in pool order, as a full scan would pick
+    delta_hits = 0
+    for scope, queued in delta_queue.items():
+        added = delta_by_scope[scope]["added"]
+        added_best = (fuzzy_engine.FuzzyPool(list(added)).best_many([core for core, _ in queued.values()], score_cutoff=93)
+                      if added else [None] * len(queued))
+        for (name, (core_name, stale_entry)), best in zip(queued.items(), added_best):
+            if best and (best[1] > stale_entry.get("score", 0) or (
+                    best[1] == stale_entry.get("score") and stale_entry.get("match")
+                    and reference_data.merge_rank(best[0]) < reference_data.merge_rank(stale_entry["match"]))):
+                tiers[name] = ("exact", added[best[0]])
+                match_memo.record(memo, name, scope, fingerprints, core_name, "fuzzy", added[best[0]], best[1], best[0])
+            elif stale_entry["tier"] == "fuzzy":
+                tiers[name] = ("exact", stale_entry["id"])
+                match_memo.record(memo, name, scope, fingerprints, core_name, "fuzzy",
+                                  stale_entry["id"], stale_entry["score"], stale_entry.get("match"))
+                revalidated += 1
+                continue
+            else:
+                tiers[name] = ("miss", None)
+                match_memo.record(memo, name, scope, fingerprints, core_name, "miss")
+                continue
+            delta_hits += 1
+
+    # Variants of one channel are matched once, through a representative
+    variant_groups = group_equivalent_names(list(pending), regional_maps)
+    for name in variant_groups:
+        core_name = pending[name]
+
+        # The callsign tier looks at every ID, so those outcomes depend on all regions
+        region = get_region_key(name, regional_maps)
+        scope = "ALL" if f"({core_name})" in name else region
+
+        # Same name up to case, HD/FHD/HEVC markers, superscripts and accents
+        key_index = get_key_index(region, key_indexes, get_regional_map(name, regional_maps, reference_data))
+        key_id = key_index.get(channel_database.canonical_key(core_name))
+        if key_id:
+            tiers[name] = ("exact", key_id)
+            match_memo.record(memo, name, scope, fingerprints, core_name, "exact", key_id)
             continue
 
-        if not OFFLINE_MODE:
+        # "(WABC)"-style names: take the ID carrying that callsign if it's
+        # unambiguous, or the single primary "WABC.us"-form ID among several
+        if f"({core_name})" in name:
+            if callsign_index is None:
+                callsign_index = epg_cache.build_callsign_index(valid_ids)
+            callsign_ids = epg_cache.lookup_callsign(callsign_index, core_name)
+            primary_ids = [xml_id for xml_id in callsign_ids if xml_id.startswith(core_name + ".")]
+            if len(callsign_ids) == 1 or len(primary_ids) == 1:
+                best_id = callsign_ids[0] if len(callsign_ids) == 1 else primary_ids[0]
+                tiers[name] = ("exact", best_id)
+                match_memo.record(memo, name, scope, fingerprints, core_name, "callsign", best_id)
+                continue
+
+        tiers[name] = ("miss", None)
+        fuzzy_queue.setdefault(region, {})[name] = core_name
+        fuzzy_scopes[name] = scope
+
+    # Fuzzy: one pre-processed pool per region, all of its queries at once,
+    # sharded across worker processes when there are enough of them
+    fuzzy_pools = {}
+    pool_maps = {region: reference_data if region == "ALL" else regional_maps[region] for region in fuzzy_queue}
+    fuzzy_queries = {region: list(queued.values()) for region, queued in fuzzy_queue.items()}
+    queued_total = sum(len(queries) for queries in fuzzy_queries.values())
+    if phase1_workers > 1 and queued_total >= fuzzy_engine.PARALLEL_MIN_QUERIES:
+        ui.info(f"Fuzzy matching {queued_total:,} channels with {phase1_workers} workers...")
+        fuzzy_results = fuzzy_engine.best_many_parallel(
+            {region: list(pool_map.keys()) for region, pool_map in pool_maps.items()},
+            fuzzy_queries, score_cutoff=93, max_workers=phase1_workers
+        )
+    else:
+        fuzzy_results = {
+            region: get_fuzzy_pool(region, fuzzy_pools, pool_maps[region]).best_many(queries, score_cutoff=93)
+            for region, queries in fuzzy_queries.items()
+        }
+    for region, queued in fuzzy_queue.items():
+        for name, best in zip(queued, fuzzy_results[region]):
+            if best:
+                tiers[name] = ("exact", pool_maps[region][best[0]])
+                match_memo.record(memo, name, fuzzy_scopes[name], fingerprints, queued[name],
+                                  "fuzzy", tiers[name][1], best[1], best[0])
+            else:
+                match_memo.record(memo, name, fuzzy_scopes[name], fingerprints, queued[name], "miss")
+
+    # Fan representatives' results out to their variants. A variant's match
+    # is the representative's decision, so it never votes for an alias
+    variant_count = 0
+    for name, members in variant_groups.items():
+        entry = memo[name]
+        for member in members:
+            tiers[member] = tiers[name]
+            match_memo.record(memo, member, entry["scope"], fingerprints, pending[member],
+                              entry["tier"], entry.get("id"), entry.get("score"), entry.get("match"))
+            if entry["tier"] != "miss":
+                alias_table.mark_derived(aliases, member)
+        variant_count += len(members)
+    if variant_count:
+        ui.info(f"{variant_count:,} playlist variants reused a representative's result "
+                f"({variant_count:,} tier scans avoided)")
+
+    # Pass 2: apply in playlist order
+    for name in target_names:
+        tier, xml_id = tiers[name]
+        if name in final_matches:
+            # Repeated playlist name - already matched above
+            stats["known"] += 1
+        elif tier == "known":
+            final_matches[name] = xml_id
+            stats["known"] += 1
+            alias_table.learn(aliases, channel_identity(name, regional_maps), name, xml_id)
+        elif tier == "exact":
+            final_matches[name] = xml_id
+            known_matches[name] = xml_id
+            stats["exact"] += 1
+        elif tier == "skipped":
+            new_missing.append(name)
+            stats["skipped"] += 1
+        elif not OFFLINE_MODE:
             ai_queue.append(name)
         else:
             new_missing.append(name)
 
     ui.success(f"{stats['known']:,} known | {stats['exact']:,} exact | {len(ai_queue):,} queued for AI")
+    if memo_hits:
+        ui.info(f"{memo_hits:,} channels resolved from the match memo")
+    if alias_hits:
+        ui.info(f"{alias_hits:,} new name variants resolved through learned aliases")
+    if delta_queue or revalidated:
+        delta_checked = sum(len(queued) for queued in delta_queue.values())
+        ui.info(f"{delta_checked:,} earlier misses and fuzzy matches checked against "
+                f"{len(delta.get('all', {}).get('added', {})):,} added names ({delta_hits:,} matched), "
+                f"{revalidated:,} earlier matches still valid")
 
     # ── Step 5: AI Matching ─────────────────────────────────
     ui.step(5, TOTAL_STEPS, "Phase 2 - AI matching...")
@@ -394,17 +664,47 @@ def main():
         ai_limit = MAX_AI_CALLS if MAX_AI_CALLS else len(ai_queue)
         ai_subset = ai_queue[:ai_limit]
         batch_size = ai_client.BATCH_SIZE
+        negative_cache = match_memo.load_negative_cache(NEGATIVE_CACHE_FILE)
+        target_set = set(target_names)
+        retry_skipped = 0
+
+        # Variants of one channel share the representative's AI slot
+        ai_groups = group_equivalent_names(ai_subset, regional_maps)
 
         # Build candidate lists for all channels first
-        ui.info(f"Building candidate lists for {len(ai_subset):,} channels...")
+        ui.info(f"Building candidate lists for {len(ai_groups):,} channels...")
+        candidate_start = time.time()
         channel_data = []
-        for name in ai_subset:
-            filtered_map = get_regional_map(name, regional_maps, reference_data)
-            filtered_names = list(filtered_map.keys())
-            search_pool = filtered_names if filtered_names else ref_names
-            pool_map = filtered_map if filtered_names else reference_data
-            candidate_dict = find_candidates(name, search_pool, pool_map, max_candidates=20)
+        pool_indexes = {}
+        for name in ai_groups:
+            candidate_dict = match_memo.cached_candidates(memo, name, fingerprints)
+            if candidate_dict is None:
+                region = get_region_key(name, regional_maps)
+                pool_map = get_regional_map(name, regional_maps, reference_data)
+                pool_index = get_pool_index(region, pool_indexes, pool_map)
+                fuzzy_pool = get_fuzzy_pool(region, fuzzy_pools, pool_map)
+                candidate_dict = find_candidates(name, pool_index.names, pool_map, max_candidates=20,
+                                                 pool_index=pool_index, fuzzy_pool=fuzzy_pool)
+                match_memo.record_candidates(memo, name, candidate_dict)
+
+            # Failed before against the same candidates - not worth another AI call yet
+            if not match_memo.should_retry(negative_cache, name, match_memo.lookup(memo, name, fingerprints),
+                                           candidate_dict, NEGATIVE_RETRY_DAYS):
+                for member in [name] + ai_groups[name]:
+                    new_missing.append(member)
+                    stats["skipped"] += 1
+                    retry_skipped += 1
+                continue
             channel_data.append((name, candidate_dict))
+        ui.info(f"Candidate lists built in {time.time() - candidate_start:.1f}s")
+        variant_count = sum(len(members) for members in ai_groups.values())
+        if variant_count:
+            batches_saved = (len(ai_subset) + batch_size - 1) // batch_size - (len(ai_groups) + batch_size - 1) // batch_size
+            ui.info(f"{variant_count:,} playlist variants share a representative's AI slot "
+                    f"({variant_count:,} candidate builds, {batches_saved:,} AI calls avoided)")
+        if retry_skipped:
+            ui.info(f"{retry_skipped:,} channels skipped - AI failed on the same candidates before "
+                    f"(retried after {NEGATIVE_RETRY_DAYS:g} days)")
 
         # Process in batches
         total_batches = (len(channel_data) + batch_size - 1) // batch_size
@@ -419,26 +719,39 @@ def main():
 
             try:
                 results = ai_client.match_batch(batch)
+                batch_candidates = dict(batch)
 
                 for name, selected_id in results.items():
+                    members = [name] + ai_groups.get(name, [])
                     if selected_id and selected_id in valid_ids:
-                        final_matches[name] = selected_id
-                        known_matches[name] = selected_id
-                        stats["ai"] += 1
+                        for member in members:
+                            final_matches[member] = selected_id
+                            known_matches[member] = selected_id
+                            stats["ai"] += 1
+                        for member in ai_groups.get(name, []):
+                            alias_table.mark_derived(aliases, member)
+                        negative_cache.pop(name, None)
                     else:
-                        new_missing.append(name)
+                        new_missing.extend(members)
+                        if name in batch_candidates:
+                            match_memo.record_failure(negative_cache, name, match_memo.lookup(memo, name, fingerprints),
+                                                      batch_candidates[name])
 
                 # Save progress after each batch
                 with open(KNOWN_MATCHES_FILE, 'w', encoding='utf-8') as f:
                     json.dump(known_matches, f, indent=4)
+                match_memo.save_negative_cache(NEGATIVE_CACHE_FILE, negative_cache, target_set, NEGATIVE_RETRY_DAYS)
 
             except Exception as e:
                 print(f"    {ui.RED}✗{ui.RESET} Batch error: {e}")
                 for name, _ in batch:
                     new_missing.append(name)
+                    new_missing.extend(ai_groups[name])
 
         if MAX_AI_CALLS and len(ai_queue) > MAX_AI_CALLS:
             new_missing.extend(ai_queue[MAX_AI_CALLS:])
+        # Also prunes it when every channel was skipped and no batch ran
+        match_memo.save_negative_cache(NEGATIVE_CACHE_FILE, negative_cache, target_set, NEGATIVE_RETRY_DAYS)
 
         ui.success(f"{stats['ai']:,} matched by AI")
 
@@ -449,6 +762,9 @@ def main():
     with open(KNOWN_MATCHES_FILE, 'w', encoding='utf-8') as f:
         json.dump(known_matches, f, indent=4)
 
+    match_memo.save_memo(MATCH_MEMO_FILE, memo, fingerprints, memo_backend)
+    alias_table.save_aliases(LEARNED_ALIASES_FILE, aliases)
+
     if os.path.exists(SUGGESTED_MATCHES_FILE):
         with open(SUGGESTED_MATCHES_FILE, 'w') as f:
             json.dump({}, f)
@@ -489,8 +805,11 @@ def main():
                     dn.text = ch_name
                     xf.write(ch_elem)
 
-                for url, filename in REFERENCE_SOURCES:
+                programme_counts = {}
+                for source in active_sources:
+                    filename = source["filename"]
                     path = os.path.join(CACHE_DIR, filename)
+                    written = 0
                     try:
                         ui.info(f"Merging {filename}...")
                         with gzip.open(path, 'rb') as source_f:
@@ -502,14 +821,21 @@ def main():
                                         prog_copy = deepcopy(elem)
                                         prog_copy.set('channel', ch_name)
                                         xf.write(prog_copy)
+                                        written += 1
                                 elem.clear()
                                 while elem.getprevious() is not None:
                                     del elem.getparent()[0]
                     except Exception as e:
                         ui.error(f"Error merging {filename}: {e}")
+                    programme_counts[source["name"]] = written
 
     ui.success(f"EPG saved to {OUTPUT_GZ}")
 
+    epg_sources.record_source_stats(
+        SOURCE_STATS_FILE, source_report, [s["name"] for s in active_sources],
+        valid_xml_ids, programme_counts
+    )
+
     # ── Step 7: Deploy & Push ───────────────────────────────
     ui.step(7, TOTAL_STEPS, "Deploy & push to GitHub...")
 
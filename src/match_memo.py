@@ -0,0 +1,180 @@
+"""
+Match Memo - Phase 1 outcomes remembered between runs
+Each entry records how a channel name resolved (key index, callsign,
+fuzzy or no match), plus its AI candidate list once built, against the
+fingerprint of the reference partition it was matched in. An entry is
+only reused while that fingerprint is unchanged, so a change to one
+region's reference data only invalidates that region's channels; Phase 1
+then carries misses and matches over by checking them against just the
+names added and removed since (epg_cache.diff_reference_index).
+
+The negative cache keeps channels the AI failed to match out of the AI
+queue until their candidate list or reference partition changes, or
+they are due for a periodic retry.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional, Set
+
+# Bump when Phase 1 tiers, normalization or candidate building change
+MEMO_VERSION = 2
+
+
+def load_memo(path: str, backend: str) -> Dict[str, Dict]:
+    """Memo entries {channel name: entry}, {} if missing, unreadable or from another version/fuzzy backend"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            memo = json.load(f)
+    except (json.JSONDecodeError, IOError, ValueError):
+        return {}
+    if memo.get("version") != MEMO_VERSION or memo.get("backend") != backend:
+        return {}
+    return memo.get("entries", {})
+
+
+def save_memo(path: str, entries: Dict[str, Dict], fingerprints: Dict[str, str], backend: str):
+    """Write the memo, dropping entries whose partition has changed since they were recorded"""
+    current = {name: entry for name, entry in entries.items() if fingerprints.get(entry["scope"]) == entry["fp"]}
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": MEMO_VERSION, "backend": backend, "entries": current}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"    [WARN] Could not save match memo {path}: {e}")
+
+
+def lookup(entries: Dict[str, Dict], name: str, fingerprints: Dict[str, str]) -> Optional[Dict]:
+    """The entry for name if its partition is unchanged, else None"""
+    entry = entries.get(name)
+    if entry is None or fingerprints.get(entry["scope"]) != entry["fp"]:
+        return None
+    return entry
+
+
+def record(
+    entries: Dict[str, Dict],
+    name: str,
+    scope: str,
+    fingerprints: Dict[str, str],
+    core: str,
+    tier: str,
+    xml_id: Optional[str] = None,
+    score: Optional[int] = None,
+    match: Optional[str] = None
+) -> Dict:
+    """
+    Remember a Phase 1 outcome. scope is the fingerprints key ("US", "CA",
+    "UK" or "ALL") of the reference data the outcome depended on; tier is
+    "exact", "callsign", "fuzzy" or "miss"; match is the display name a
+    fuzzy match landed on.
+    """
+    entry = {"scope": scope, "fp": fingerprints[scope], "core": core, "tier": tier}
+    if xml_id is not None:
+        entry["id"] = xml_id
+    if score is not None:
+        entry["score"] = score
+    if match is not None:
+        entry["match"] = match
+    entries[name] = entry
+    return entry
+
+
+def record_candidates(entries: Dict[str, Dict], name: str, candidates: Dict[str, str]):
+    """Attach the AI candidate list to name's entry (if it has one)"""
+    if name in entries:
+        entries[name]["candidates"] = candidates
+
+
+def cached_candidates(entries: Dict[str, Dict], name: str, fingerprints: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """name's remembered AI candidate list if its partition is unchanged, else None"""
+    entry = lookup(entries, name, fingerprints)
+    return entry.get("candidates") if entry else None
+
+
+# Negative cache: channels the AI could not match, by the candidate list
+# and reference partition they failed against
+
+def load_negative_cache(path: str) -> Dict[str, Dict]:
+    """Failed channels {channel name: entry}, {} if missing or unreadable"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError, ValueError):
+        return {}
+
+
+def save_negative_cache(
+    path: str,
+    entries: Dict[str, Dict],
+    active_names: Set[str],
+    retry_days: float,
+    now: Optional[float] = None
+):
+    """
+    Write the negative cache, dropping channels no longer in active_names
+    and failures older than retry_days (they are due for a retry anyway).
+    """
+    cutoff = (now or time.time()) - retry_days * 86400
+    for name in [name for name, entry in entries.items() if name not in active_names or entry["failed_at"] < cutoff]:
+        del entries[name]
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=2, ensure_ascii=False)
+    except OSError as e:
+        print(f"    [WARN] Could not save negative cache {path}: {e}")
+
+
+def candidates_fingerprint(candidates: Dict[str, str]) -> str:
+    """Hash of a candidate list, order included (it is what the AI is shown)"""
+    return hashlib.sha1(json.dumps(candidates, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def should_retry(
+    entries: Dict[str, Dict],
+    name: str,
+    memo_entry: Optional[Dict],
+    candidates: Dict[str, str],
+    retry_days: float,
+    now: Optional[float] = None
+) -> bool:
+    """
+    False only if name failed before against the same reference partition
+    and the same candidate list, less than retry_days ago.
+    """
+    entry = entries.get(name)
+    if entry is None or memo_entry is None:
+        return True
+    if entry["scope"] != memo_entry["scope"] or entry["fp"] != memo_entry["fp"]:
+        return True
+    if entry["candidates"] != candidates_fingerprint(candidates):
+        return True
+    return (now or time.time()) - entry["failed_at"] >= retry_days * 86400
+
+
+def record_failure(
+    entries: Dict[str, Dict],
+    name: str,
+    memo_entry: Optional[Dict],
+    candidates: Dict[str, str],
+    now: Optional[float] = None
+):
+    """Remember that name was sent to the AI with these candidates and not matched"""
+    if memo_entry is None:
+        return
+    previous = entries.get(name, {})
+    entries[name] = {
+        "scope": memo_entry["scope"],
+        "fp": memo_entry["fp"],
+        "candidates": candidates_fingerprint(candidates),
+        "failed_at": now or time.time(),
+        "failures": previous.get("failures", 0) + 1,
+    }
@@ -0,0 +1,130 @@
+"""
+Name Index - substring lookups over reference display names
+Built once per search pool so find_candidates() doesn't rescan the pool per term
+"""
+from typing import Dict, List, Optional, Set
+
+NGRAM = 3
+
+
+def _ngrams(text: str) -> Set[str]:
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class NameIndex:
+    """
+    Index over one search pool (a list of display names, in pool order).
+
+    Query results are pool positions in ascending order, so callers that
+    stop at a candidate cap see names in the same order as a linear scan.
+    """
+
+    def __init__(self, names: List[str]):
+        self.names = names
+        self.lower = [name.lower() for name in names]
+        self._ngrams: Optional[Dict[str, Set[int]]] = None
+        self._by_lower: Optional[Dict[str, List[int]]] = None
+        self._words: Optional[Dict[str, List[int]]] = None
+        self._vocab: List[str] = []
+        self._vocab_ngrams: Dict[str, Set[int]] = {}
+        self._word_hits: Dict[str, Set[int]] = {}
+
+    def _build_substring_index(self):
+        ngrams = {}
+        by_lower = {}
+        for pos, name in enumerate(self.lower):
+            by_lower.setdefault(name, []).append(pos)
+            for gram in _ngrams(name):
+                ngrams.setdefault(gram, set()).add(pos)
+        self._ngrams = ngrams
+        self._by_lower = by_lower
+
+    def substring_matches(self, term_lower: str) -> List[int]:
+        """
+        Positions of names where term_lower is a substring of the
+        lower-cased name, or the lower-cased name is a substring of term_lower.
+        """
+        if self._ngrams is None:
+            self._build_substring_index()
+
+        # term in name: intersect n-gram postings (smallest first), then verify
+        if len(term_lower) >= NGRAM:
+            postings = []
+            for gram in _ngrams(term_lower):
+                posting = self._ngrams.get(gram)
+                if not posting:
+                    postings = None
+                    break
+                postings.append(posting)
+            if postings is None:
+                hits = set()
+            else:
+                postings.sort(key=len)
+                hits = set(postings[0])
+                for posting in postings[1:]:
+                    hits &= posting
+                    if not hits:
+                        break
+                hits = {pos for pos in hits if term_lower in self.lower[pos]}
+        else:
+            hits = {pos for pos, name in enumerate(self.lower) if term_lower in name}
+
+        # name in term: every substring of the term is a possible whole name
+        length = len(term_lower)
+        pieces = {term_lower[start:end] for start in range(length + 1) for end in range(start, length + 1)}
+        for piece in pieces:
+            hits.update(self._by_lower.get(piece, ()))
+
+        return sorted(hits)
+
+    def _build_word_index(self):
+        words = {}
+        for pos, name in enumerate(self.lower):
+            for token in set(name.split()):
+                words.setdefault(token, []).append(pos)
+        self._words = words
+        self._vocab = list(words)
+        for vocab_pos, token in enumerate(self._vocab):
+            for gram in _ngrams(token):
+                self._vocab_ngrams.setdefault(gram, set()).add(vocab_pos)
+
+    def _word_matches(self, word: str) -> Set[int]:
+        """
+        Positions of names containing word as a substring. word has no
+        whitespace, so any match lies inside one name token - look the word
+        up in the token vocabulary and union those tokens' postings.
+        """
+        if word in self._word_hits:
+            return self._word_hits[word]
+
+        if len(word) >= NGRAM:
+            postings = [self._vocab_ngrams.get(gram, set()) for gram in _ngrams(word)]
+            postings.sort(key=len)
+            vocab_hits = set(postings[0])
+            for posting in postings[1:]:
+                vocab_hits &= posting
+            tokens = [self._vocab[i] for i in vocab_hits]
+        else:
+            tokens = self._vocab
+        hits = set()
+        for token in tokens:
+            if word in token:
+                hits.update(self._words[token])
+
+        self._word_hits[word] = hits
+        return hits
+
+    def all_words_matches(self, words: List[str]) -> List[int]:
+        """Positions of names whose lower-cased form contains every word (already lower-cased)"""
+        if self._words is None:
+            self._build_word_index()
+
+        postings = sorted((self._word_matches(word) for word in set(words)), key=len)
+        if not postings:
+            return list(range(len(self.names)))
+        hits = set(postings[0])
+        for posting in postings[1:]:
+            hits &= posting
+            if not hits:
+                break
+        return sorted(hits)
@@ -1,18 +1,17 @@
 import os
 import json
-import requests
-import gzip
 import time
-from lxml import etree
 from dotenv import load_dotenv
 import ai_client
-import gc
+import epg_cache
+import epg_sources
 
 load_dotenv()
 
 MISSING_LOG = "./logs/missing_channels.txt"
 KNOWN_MATCHES_FILE = "./data/known_matches.json"
 CACHE_DIR = "./data/cache"
+BROAD_INDEX_FILE = os.path.join(CACHE_DIR, "broad_index.bin")
 
 JUNK_KEYWORDS = [
     "backup", "raw", "hevc", "vip", "feed", "event", "ppv", 
@@ -20,13 +19,9 @@ JUNK_KEYWORDS = [
     "pluto", "samsung", "rakuten", "plex", "section", "---"
 ]
 
-BROAD_SOURCES = [
-    "https://epgshare01.online/epgshare01/epg_ripper_US_LOCALS1.xml.gz",
-    "https://epgshare01.online/epgshare01/epg_ripper_ALL_SOURCES1.xml.gz",
-    "https://i.mjh.nz/PlutoTV/us.xml.gz",
-    # ADDED: EPGHub Canada
-    "https://epghub.xyz/epg/EPG-CA.xml.gz"
-]
+# Shared with main.py's reference cache - see epg_sources.py
+BROAD_SOURCES = epg_sources.get_sources("broad")
+CACHE_MAX_AGE = float(os.getenv("CACHE_MAX_AGE", "24"))
 
 def clean_line_data(line):
     if not line or any(k in line.lower() for k in JUNK_KEYWORDS): return None
@@ -36,38 +31,12 @@ def clean_line_data(line):
     return line.strip()
 
 def load_broad_database():
-    os.makedirs(CACHE_DIR, exist_ok=True)
-    master_index = {} 
+    """Merged index of the broad sources, memory-mapped when no source changed since the last run"""
     print(f"\n[*] Loading Broader Database...")
-    
-    for url in BROAD_SOURCES:
-        filename = url.split("/")[-1]
-        local_path = os.path.join(CACHE_DIR, filename)
-        
-        if not os.path.exists(local_path):
-            try:
-                print(f"    - Downloading {filename}...")
-                with requests.get(url, stream=True) as r:
-                    r.raise_for_status()
-                    with open(local_path, 'wb') as f:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            f.write(chunk)
-            except: continue
-
-        try:
-            with gzip.open(local_path, 'rb') as gz:
-                context = etree.iterparse(gz, events=("end",), tag="channel")
-                for event, elem in context:
-                    xml_id = elem.get("id")
-                    dn = elem.find("display-name")
-                    if xml_id and dn is not None and dn.text:
-                        master_index[dn.text.strip().upper()] = xml_id
-                    elem.clear()
-                    while elem.getprevious() is not None: del elem.getparent()[0]
-                del context
-                gc.collect()
-        except: pass
-    return master_index
+    db, _ = epg_cache.fetch_reference_data_smart(
+        BROAD_SOURCES, CACHE_DIR, cache_max_age_hours=CACHE_MAX_AGE, mapped_index=BROAD_INDEX_FILE
+    )
+    return db
 
 def main():
     if not os.path.exists(MISSING_LOG): return
@@ -98,14 +67,10 @@ def main():
         if aliases:
             print(f"    -> Suggestions: {aliases}")
             for alias in aliases:
-                key = alias.upper()
-                if key in db:
-                    found_id = db[key]
-                    break
-                for s in [" DT", " HD", "-EAST", " US", " CA"]:
-                    if (key + s) in db:
-                        found_id = db[key+s]
-                        break
+                # Display names compared upper-cased
+                for s in ["", " DT", " HD", "-EAST", " US", " CA"]:
+                    found_id = db.get_folded(alias + s)
+                    if found_id: break
                 if found_id: break
 
         if found_id:
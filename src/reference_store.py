@@ -0,0 +1,511 @@
+"""
+Reference Store - compact, interned channel index
+Holds every display name and XMLID once in flat sorted tables joined by
+integer codes, so the merged index, its regional views, the ID set and the
+ID -> names lookup share storage instead of each being its own dict
+
+The frozen tables can be written to a binary file (write_mapped) and
+opened again with mmap (open_mapped) without deserializing anything:
+lookups decode only the strings they touch, and every process opening
+the file shares one page-cached copy.
+"""
+import hashlib
+import json
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence as AbstractSequence, Set as AbstractSet
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _find(table: List[str], value: str, start: int, stop: int) -> int:
+    """Position of value in the sorted slice table[start:stop], or -1"""
+    pos = bisect_left(table, value, start, stop)
+    return pos if pos < stop and table[pos] == value else -1
+
+
+class RegionView(Mapping):
+    """Read-only {display_name: xmlid} over one region's slice of a ReferenceStore, in merge order"""
+
+    def __init__(self, store: 'ReferenceStore', region: Optional[str]):
+        self._store = store
+        self._start, self._stop = store.name_ranges[region]
+        self._order = store.region_order[region]
+
+    def __getitem__(self, name: str) -> str:
+        code = _find(self._store.names, name, self._start, self._stop)
+        if code < 0:
+            raise KeyError(name)
+        return self._store.ids[self._store.name_ids[code]]
+
+    def __contains__(self, name) -> bool:
+        return isinstance(name, str) and _find(self._store.names, name, self._start, self._stop) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        names = self._store.names
+        for code in self._order:
+            yield names[code]
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+
+class _StringTable(AbstractSequence):
+    """Read-only list of strings stored as UTF-8 in a buffer, with a uint32 offsets array"""
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __getitem__(self, pos: int) -> str:
+        if pos < 0:
+            pos += len(self)
+        if not 0 <= pos < len(self):
+            raise IndexError(pos)
+        return str(self._blob[self._offsets[pos]:self._offsets[pos + 1]], 'utf-8')
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+
+class IdSetView(AbstractSet):
+    """Read-only set of XMLIDs over region slices of a ReferenceStore's ID table"""
+
+    def __init__(self, store: 'ReferenceStore', ranges: List[Tuple[int, int]]):
+        self._ids = store.ids
+        self._ranges = ranges
+
+    def __contains__(self, xmlid) -> bool:
+        if not isinstance(xmlid, str):
+            return False
+        return any(_find(self._ids, xmlid, start, stop) >= 0 for start, stop in self._ranges)
+
+    def __iter__(self) -> Iterator[str]:
+        for start, stop in self._ranges:
+            for pos in range(start, stop):
+                yield self._ids[pos]
+
+    def __len__(self) -> int:
+        return sum(stop - start for start, stop in self._ranges)
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return set(iterable)
+
+
+class IdCodeSetView(AbstractSet):
+    """Read-only set of XMLIDs given as a sorted array of ID codes"""
+
+    def __init__(self, store: 'ReferenceStore', codes: Sequence[int]):
+        self._store = store
+        self._codes = codes
+
+    def __contains__(self, xmlid) -> bool:
+        if not isinstance(xmlid, str):
+            return False
+        id_code = self._store._id_code(xmlid)
+        if id_code < 0:
+            return False
+        pos = bisect_left(self._codes, id_code)
+        return pos < len(self._codes) and self._codes[pos] == id_code
+
+    def __iter__(self) -> Iterator[str]:
+        ids = self._store.ids
+        for id_code in self._codes:
+            yield ids[id_code]
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return set(iterable)
+
+
+class ReferenceStore(Mapping):
+    """
+    {display_name: xmlid} with first-source-wins merge order, stored as:
+      names          display names grouped by region, sorted within each group
+      name_ids       array: name code -> XMLID code
+      ids            XMLIDs grouped by region, sorted within each group
+      id_offsets,    CSR table: XMLID code -> its name codes (merge order)
+      id_name_codes
+      order          array: name codes in overall merge order
+      region_order   {region: array of that region's name codes in merge order}
+    Lookups are binary searches, regional maps and ID sets are ranges of
+    these tables, and there are no per-entry dicts once frozen.
+
+    Fill with add() / add_id() in merge order, then call freeze().
+    """
+
+    def __init__(self, regions: Sequence[str]):
+        self.regions = tuple(regions) + (None,)
+        self.names: List[str] = []
+        self.ids: List[str] = []
+        self.name_ids = array('I')
+        self.id_offsets = array('I')
+        self.id_name_codes = array('I')
+        self.order = array('I')
+        self.region_order: Dict[Optional[str], array] = {}
+        self.name_ranges: Dict[Optional[str], Tuple[int, int]] = {}
+        self.id_ranges: Dict[Optional[str], Tuple[int, int]] = {}
+        # Upper-cased names (first in merge order wins), built on first use
+        self.folded: Optional[Sequence[str]] = None
+        self.folded_ids: Optional[Sequence[int]] = None
+        # Merge position of each name code, built on first use
+        self.ranks: Optional[array] = None
+        # {source name: sorted ID codes}, only in mapped stores
+        self.source_codes: Dict[str, Sequence[int]] = {}
+        # Content hashes, computed on first use (stored in mapped files)
+        self.whole_fingerprint: Optional[str] = None
+        self.region_fingerprints: Dict[Optional[str], str] = {}
+        # Only while filling
+        self._seen_names = set()
+        self._pending_names: List[str] = []
+        self._pending_ids: List[str] = []
+        self._pending_regions = bytearray()
+        self._id_regions: Dict[str, Optional[str]] = {}
+        self._frozen = False
+
+    def add_id(self, xmlid: str, region: Optional[str]):
+        """Record a channel ID (with or without display names)"""
+        self._id_regions.setdefault(xmlid, region)
+
+    def add(self, display_name: str, xmlid: str, region: Optional[str]) -> bool:
+        """Add a name unless already present (first occurrence wins). Returns True if added."""
+        if display_name in self._seen_names:
+            return False
+        self._seen_names.add(display_name)
+        self._id_regions.setdefault(xmlid, region)
+        self._pending_names.append(display_name)
+        self._pending_ids.append(xmlid)
+        self._pending_regions.append(self.regions.index(region))
+        return True
+
+    def freeze(self) -> 'ReferenceStore':
+        """Build the sorted tables and drop the fill-time structures"""
+        if self._frozen:
+            return self
+        self._frozen = True
+        self._seen_names = None
+        pending_names, self._pending_names = self._pending_names, None
+        pending_ids, self._pending_ids = self._pending_ids, None
+        pending_regions, self._pending_regions = self._pending_regions, None
+
+        # IDs: grouped by region, sorted within each group
+        by_region = {region: [] for region in self.regions}
+        for xmlid, region in self._id_regions.items():
+            by_region[region].append(xmlid)
+        self._id_regions = None
+        for region in self.regions:
+            start = len(self.ids)
+            self.ids.extend(sorted(by_region.pop(region)))
+            self.id_ranges[region] = (start, len(self.ids))
+        id_codes = {xmlid: code for code, xmlid in enumerate(self.ids)}
+
+        # Names: same grouping; order holds each merge position's final code
+        self.order = array('I', [0]) * len(pending_names)
+        for region_index, region in enumerate(self.regions):
+            positions = [pos for pos, r in enumerate(pending_regions) if r == region_index]
+            positions.sort(key=pending_names.__getitem__)
+            start = len(self.names)
+            for offset, pos in enumerate(positions):
+                self.names.append(pending_names[pos])
+                self.name_ids.append(id_codes[pending_ids[pos]])
+                self.order[pos] = start + offset
+            self.name_ranges[region] = (start, len(self.names))
+        del id_codes, pending_names, pending_ids
+
+        for region in self.regions:
+            start, stop = self.name_ranges[region]
+            self.region_order[region] = array('I', (code for code in self.order if start <= code < stop))
+
+        # CSR XMLID -> name codes, in merge order
+        counts = array('I', [0]) * len(self.ids)
+        for id_code in self.name_ids:
+            counts[id_code] += 1
+        self.id_offsets = array('I', [0]) * (len(self.ids) + 1)
+        for id_code, count in enumerate(counts):
+            self.id_offsets[id_code + 1] = self.id_offsets[id_code] + count
+        fill = array('I', self.id_offsets[:-1])
+        self.id_name_codes = array('I', [0]) * len(self.names)
+        for code in self.order:
+            id_code = self.name_ids[code]
+            self.id_name_codes[fill[id_code]] = code
+            fill[id_code] += 1
+        return self
+
+    def _name_code(self, name: str) -> int:
+        for start, stop in self.name_ranges.values():
+            code = _find(self.names, name, start, stop)
+            if code >= 0:
+                return code
+        return -1
+
+    def __getitem__(self, name: str) -> str:
+        code = self._name_code(name)
+        if code < 0:
+            raise KeyError(name)
+        return self.ids[self.name_ids[code]]
+
+    def __contains__(self, name) -> bool:
+        return isinstance(name, str) and self._name_code(name) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        names = self.names
+        for code in self.order:
+            yield names[code]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def region(self, region: Optional[str]) -> RegionView:
+        """{display_name: xmlid} for one region, in merge order"""
+        return RegionView(self, region)
+
+    def id_set(self) -> IdSetView:
+        """Every XMLID as a read-only set"""
+        return IdSetView(self, list(self.id_ranges.values()))
+
+    def region_ids(self, region: Optional[str]) -> IdSetView:
+        """One region's XMLIDs as a read-only set"""
+        return IdSetView(self, [self.id_ranges[region]])
+
+    def _id_code(self, xmlid: str) -> int:
+        for start, stop in self.id_ranges.values():
+            id_code = _find(self.ids, xmlid, start, stop)
+            if id_code >= 0:
+                return id_code
+        return -1
+
+    def names_for(self, xmlid: str) -> List[str]:
+        """Display names of an XMLID, in merge order (first is the primary name)"""
+        id_code = self._id_code(xmlid)
+        if id_code < 0:
+            return []
+        first, last = self.id_offsets[id_code], self.id_offsets[id_code + 1]
+        return [self.names[code] for code in self.id_name_codes[first:last]]
+
+    def _build_folded(self):
+        folded = {}
+        for code in self.order:
+            folded.setdefault(self.names[code].upper(), self.name_ids[code])
+        self.folded = sorted(folded)
+        self.folded_ids = array('I', (folded[key] for key in self.folded))
+
+    def get_folded(self, name: str) -> Optional[str]:
+        """XMLID for a display name compared upper-cased (first in merge order wins), or None"""
+        if self.folded is None:
+            self._build_folded()
+        key = name.upper()
+        pos = _find(self.folded, key, 0, len(self.folded))
+        return self.ids[self.folded_ids[pos]] if pos >= 0 else None
+
+    def merge_rank(self, name: str) -> int:
+        """Position of a display name in merge order (pool order), -1 if absent"""
+        if self.ranks is None:
+            self.ranks = array('I', [0]) * len(self.names)
+            for position, code in enumerate(self.order):
+                self.ranks[code] = position
+        code = self._name_code(name)
+        return self.ranks[code] if code >= 0 else -1
+
+    def _build_fingerprints(self):
+        whole = hashlib.sha1()
+        for code in self.order:
+            whole.update(f"{self.names[code]}\t{self.ids[self.name_ids[code]]}\n".encode('utf-8'))
+        for region in self.regions:
+            digest = hashlib.sha1()
+            for code in self.region_order[region]:
+                digest.update(f"{self.names[code]}\t{self.ids[self.name_ids[code]]}\n".encode('utf-8'))
+            start, stop = self.id_ranges[region]
+            for pos in range(start, stop):
+                entry = f"{self.ids[pos]}\n".encode('utf-8')
+                digest.update(entry)
+                whole.update(entry)
+            self.region_fingerprints[region] = digest.hexdigest()
+        self.whole_fingerprint = whole.hexdigest()
+
+    def fingerprint(self) -> str:
+        """Hash of every name -> XMLID pair (in merge order) and every XMLID"""
+        if self.whole_fingerprint is None:
+            self._build_fingerprints()
+        return self.whole_fingerprint
+
+    def region_fingerprint(self, region: Optional[str]) -> str:
+        """Hash of one region's name -> XMLID pairs (in merge order) and XMLIDs"""
+        if self.whole_fingerprint is None:
+            self._build_fingerprints()
+        return self.region_fingerprints[region]
+
+    def source_ids(self, source_name: str) -> IdCodeSetView:
+        """XMLIDs a source supplied, as a read-only set (mapped stores only)"""
+        return IdCodeSetView(self, self.source_codes[source_name])
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process in MB, or None where unsupported"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+# Bump when the binary layout changes
+MAPPED_VERSION = 2
+MAPPED_MAGIC = b"EPGREFX\n"
+
+
+def _string_table(strings: Sequence[str]) -> Tuple[array, bytes]:
+    offsets = array('I', [0])
+    chunks = []
+    size = 0
+    for text in strings:
+        data = text.encode('utf-8')
+        chunks.append(data)
+        size += len(data)
+        offsets.append(size)
+    return offsets, b''.join(chunks)
+
+
+def write_mapped(
+    store: ReferenceStore,
+    path: str,
+    key: str,
+    source_ids: Optional[Dict[str, Iterable[str]]] = None
+):
+    """
+    Write a frozen store to path for open_mapped(). key identifies the
+    inputs it was built from (open_mapped only accepts a matching key).
+    source_ids ({source name: XMLIDs}) lets source_ids() answer later.
+    Written to a temp file and renamed into place.
+    """
+    store.freeze()
+    if store.folded is None:
+        store._build_folded()
+
+    name_offsets, name_blob = _string_table(store.names)
+    id_offsets, id_blob = _string_table(store.ids)
+    folded_offsets, folded_blob = _string_table(store.folded)
+    region_order = array('I')
+    for region in store.regions:
+        region_order.extend(store.region_order[region])
+
+    sections = [
+        ("name_offsets", name_offsets), ("name_blob", name_blob),
+        ("id_offsets", id_offsets), ("id_blob", id_blob),
+        ("name_ids", store.name_ids), ("order", store.order), ("region_order", region_order),
+        ("csr_offsets", store.id_offsets), ("csr_codes", store.id_name_codes),
+        ("folded_offsets", folded_offsets), ("folded_blob", folded_blob),
+        ("folded_ids", array('I', store.folded_ids)),
+    ]
+    sources = []
+    for index, (name, ids) in enumerate((source_ids or {}).items()):
+        codes = array('I', sorted(store._id_code(xmlid) for xmlid in ids))
+        sections.append((f"source_{index}", codes))
+        sources.append(name)
+
+    # Sections start on 4-byte boundaries so uint32 arrays can be cast in place
+    layout = {}
+    offset = 0
+    for name, data in sections:
+        size = len(data) * data.itemsize if isinstance(data, array) else len(data)
+        layout[name] = (offset, size)
+        offset += size + (-size % 4)
+
+    header = json.dumps({
+        "version": MAPPED_VERSION,
+        "key": key,
+        "byteorder": sys.byteorder,
+        "regions": list(store.regions),
+        "name_ranges": [store.name_ranges[region] for region in store.regions],
+        "id_ranges": [store.id_ranges[region] for region in store.regions],
+        "sources": sources,
+        "fingerprint": store.fingerprint(),
+        "region_fingerprints": [store.region_fingerprint(region) for region in store.regions],
+        "sections": layout,
+    }).encode('utf-8')
+    header += b' ' * (-(len(MAPPED_MAGIC) + 4 + len(header)) % 4)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAPPED_MAGIC)
+        f.write(len(header).to_bytes(4, 'little'))
+        f.write(header)
+        for name, data in sections:
+            data = data.tobytes() if isinstance(data, array) else data
+            f.write(data)
+            f.write(b'\0' * (-len(data) % 4))
+    os.replace(tmp_path, path)
+
+
+def open_mapped(path: str, key: Optional[str] = None, in_memory: bool = False) -> Optional[ReferenceStore]:
+    """
+    Open a file written by write_mapped() as a frozen ReferenceStore whose
+    tables are views of the mapped file. Returns None if the file is
+    missing, unreadable, from another version or byte order, or (when key
+    is given) built from different inputs.
+
+    in_memory=True reads the file instead of mapping it, so it can be
+    replaced while the store is still in use (Windows won't replace a
+    mapped file).
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(MAPPED_MAGIC)) != MAPPED_MAGIC:
+                return None
+            header_size = int.from_bytes(f.read(4), 'little')
+            header = json.loads(f.read(header_size).decode('utf-8'))
+            if header.get("version") != MAPPED_VERSION or header.get("byteorder") != sys.byteorder:
+                return None
+            if key is not None and header.get("key") != key:
+                return None
+            if in_memory:
+                f.seek(0)
+                mapped = f.read()
+            else:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    data = memoryview(mapped)[len(MAPPED_MAGIC) + 4 + header_size:]
+
+    def section(name: str, cast: bool = True) -> memoryview:
+        start, size = header["sections"][name]
+        view = data[start:start + size]
+        return view.cast('I') if cast else view
+
+    regions = header["regions"]
+    store = ReferenceStore([region for region in regions if region is not None])
+    store._seen_names = store._pending_names = store._pending_ids = None
+    store._pending_regions = store._id_regions = None
+    store._frozen = True
+    store.names = _StringTable(section("name_offsets"), section("name_blob", cast=False))
+    store.ids = _StringTable(section("id_offsets"), section("id_blob", cast=False))
+    store.name_ids = section("name_ids")
+    store.order = section("order")
+    store.id_offsets = section("csr_offsets")
+    store.id_name_codes = section("csr_codes")
+    store.folded = _StringTable(section("folded_offsets"), section("folded_blob", cast=False))
+    store.folded_ids = section("folded_ids")
+    region_order = section("region_order")
+    for region, name_range, id_range in zip(regions, header["name_ranges"], header["id_ranges"]):
+        store.name_ranges[region] = tuple(name_range)
+        store.id_ranges[region] = tuple(id_range)
+        start, stop = name_range
+        store.region_order[region] = region_order[start:stop]
+    store.whole_fingerprint = header["fingerprint"]
+    store.region_fingerprints = dict(zip(regions, header["region_fingerprints"]))
+    for index, name in enumerate(header["sources"]):
+        store.source_codes[name] = section(f"source_{index}")
+    return store
@@ -0,0 +1,100 @@
+import gzip
+import json
+import os
+
+import epg_cache
+
+
+def _channel(i, name=None):
+    return f'<channel id="c{i}.us"><display-name>{name or f"Channel {i}"}</display-name></channel>'
+
+
+def _write_source(path, channels):
+    document = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<tv>\n'
+        + "\n".join(channels)
+        + '\n<programme channel="c1.us" start="20260101000000 +0000"><title>News</title></programme>\n</tv>\n'
+    )
+    with open(path, "wb") as f:
+        f.write(gzip.compress(document.encode("utf-8")))
+
+
+def _snapshot_ids(path):
+    with open(epg_cache.snapshot_path(path), encoding="utf-8") as f:
+        return set(json.load(f)["valid_ids"])
+
+
+def test_markup_error_in_channel_block_keeps_last_good_snapshot(tmp_path):
+    path = str(tmp_path / "source.xml.gz")
+    channels = [_channel(i) for i in range(100)]
+    _write_source(path, channels)
+    _, valid_ids, _ = epg_cache.parse_and_snapshot(path, early_exit=False)
+    assert len(valid_ids) == 100
+
+    # Same feed with one broken <channel> element: recovery loses the rest of the block
+    channels[6] = '<channel id="c6.us><display-name>Channel 6</display-name></channel>'
+    _write_source(path, channels)
+    os.utime(path, (1, 1))
+    _, valid_ids, _ = epg_cache.parse_and_snapshot(path, early_exit=False)
+
+    assert len(valid_ids) == 100
+    assert len(_snapshot_ids(path)) == 100
+    # Markup errors aren't corruption: the file stays for Step 6
+    assert os.path.exists(path)
+
+
+def test_recovered_parse_is_used_but_not_snapshotted(tmp_path):
+    path = str(tmp_path / "source.xml.gz")
+    channels = [_channel(i) for i in range(10)]
+    _write_source(path, channels)
+    epg_cache.parse_and_snapshot(path, early_exit=False)
+
+    channels[3] = _channel(3, "News & Weather")
+    channels.append(_channel(10))
+    _write_source(path, channels)
+    os.utime(path, (1, 1))
+    _, valid_ids, _ = epg_cache.parse_and_snapshot(path, early_exit=False)
+
+    assert len(valid_ids) == 11
+    assert len(_snapshot_ids(path)) == 10
+
+
+def test_streaming_parser_leaves_markup_errors_to_the_disk_parse(tmp_path):
+    path = str(tmp_path / "source.xml.gz")
+    channels = [_channel(i) for i in range(10)]
+    channels[3] = _channel(3, "News & Weather")
+    _write_source(path, channels)
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    sink = epg_cache.StreamingChannelParser(gzipped=True)
+    sink.reset()
+    for start in range(0, len(raw), 64):
+        sink.feed(raw[start:start + 64])
+
+    assert sink.integrity_problem() is None
+    assert sink.finish() is None
+
+
+CALLSIGN_IDS = {
+    "WABC.us",
+    "ABC.(WABC).New.York,.NY.us",
+    "WABCX.us",
+    "NBC.(KXAS-DT).Dallas.TX.us",
+    "CBLT.ca",
+}
+
+
+def test_lookup_callsign_matches_whole_tokens():
+    index = epg_cache.build_callsign_index(CALLSIGN_IDS)
+
+    assert epg_cache.lookup_callsign(index, "WABC") == ["ABC.(WABC).New.York,.NY.us", "WABC.us"]
+    assert epg_cache.lookup_callsign(index, "wabcx") == ["WABCX.us"]
+    assert epg_cache.lookup_callsign(index, "ABCX") == []
+
+
+def test_lookup_callsign_joins_hyphenated_callsigns():
+    index = epg_cache.build_callsign_index(CALLSIGN_IDS)
+
+    assert epg_cache.lookup_callsign(index, "KXASDT") == ["NBC.(KXAS-DT).Dallas.TX.us"]
+    assert epg_cache.lookup_callsign(index, "KXAS") == ["NBC.(KXAS-DT).Dallas.TX.us"]